@@ -0,0 +1,305 @@
+"""Load test of the API against the in-process Neo4j stand-in (see `benchmarks.standin`).
+
+Drives a weighted mix of sign-in, restaurant list/get/create, like/unlike and /users/me straight
+through the ASGI app at the given concurrency, and reports latency percentiles and throughput
+per route. Save a run as the baseline, later runs compared to it fail (exit code 1) when a
+route's p50, p95 or p99 got slower than `--tolerance`. Saved runs record the machine they ran on,
+compare runs made on the same machine with the same parameters:
+
+    python -m benchmarks.load --requests 20000 --concurrency 64 --save benchmarks/baseline.json
+    python -m benchmarks.load --requests 20000 --concurrency 64 --compare benchmarks/baseline.json
+
+benchmarks/baseline.json is committed, re-save it after a change that is meant to move the numbers
+or when comparing on another machine.
+"""
+import os
+import sys
+import json
+import math
+import time
+import platform
+import uuid
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks.standin import StandInDatabase, seed_graph
+from src.auth.services import create_access_token, pwd_context
+from src.core.db import get_db
+from src.main import app
+
+
+PASSWORD = "benchmark-password"
+CUISINES = ["italian", "japanese", "mexican", "indian", "french", "georgian"]
+DEFAULT_MIX = "sign_in=1,list=30,get=30,create=2,like=15,me=20"
+PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+
+class ASGIClient:
+    """Sends requests straight to an ASGI app, no sockets or HTTP parsing involved."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        query: Optional[Dict[str, Any]] = None,
+        json_body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        """Status, body and headers (lowercase names) of the response."""
+        body = json.dumps(json_body).encode() if json_body is not None else b""
+        raw_headers = [(b"host", b"benchmark"), (b"content-length", str(len(body)).encode())]
+        if json_body is not None:
+            raw_headers.append((b"content-type", b"application/json"))
+        raw_headers += [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(query or {}).encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("benchmark", 80),
+        }
+        status, chunks, response_headers = 0, [], {}
+        request_sent, response_done = False, asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await response_done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = {key.decode(): value.decode() for key, value in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    response_done.set()
+
+        await self.app(scope, receive, send)
+        response_done.set()
+        return status, b"".join(chunks), response_headers
+
+
+class Workload:
+    """The benchmarked requests. Each returns the route label and the response status."""
+
+    def __init__(self, client: ASGIClient, db: StandInDatabase, tokens: Dict[str, str]):
+        self.client = client
+        self.db = db
+        self.tokens = tokens
+        self.restaurant_ids = list(db.graph.restaurants)
+
+    async def sign_in(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        email = self.db.graph.users[user_id]["email"]
+        credentials = {"email": email, "password": PASSWORD}
+        status, _, _ = await self.client.request("POST", "/auth/sign-in", json_body=credentials)
+        return "POST /auth/sign-in", status
+
+    async def list(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        query = {"limit": 20}
+        if rng.random() < 0.5:
+            query["cuisine"] = rng.choice(CUISINES)
+        status, _, _ = await self.client.request("GET", "/restaurants/", query=query)
+        return "GET /restaurants", status
+
+    async def get(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        status, _, _ = await self.client.request("GET", f"/restaurants/{rng.choice(self.restaurant_ids)}")
+        return "GET /restaurants/{id}", status
+
+    async def create(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        restaurant = {"name": f"Created {uuid.uuid4()}", "cuisine": rng.choice(CUISINES), "about": "Benchmark"}
+        status, _, _ = await self.client.request("POST", "/restaurants/", json_body=restaurant)
+        return "POST /restaurants", status
+
+    async def like(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        """Unlike if the user already likes the restaurant, like otherwise."""
+        restaurant_id = rng.choice(self.restaurant_ids)
+        add = (user_id, restaurant_id) not in self.db.graph.likes
+        query = {"user_id": user_id, "add": str(add).lower()}
+        status, _, _ = await self.client.request("POST", f"/restaurants/{restaurant_id}/like", query=query)
+        return ("POST /restaurants/{id}/like" if add else "POST /restaurants/{id}/like (unlike)"), status
+
+    async def me(self, rng: random.Random, user_id: str) -> Tuple[str, int]:
+        headers = {"Authorization": f"Bearer {self.tokens[user_id]}"}
+        status, _, _ = await self.client.request("GET", "/users/me", headers=headers)
+        return "GET /users/me", status
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        scenario, _, weight = part.partition("=")
+        if not hasattr(Workload, scenario.strip()):
+            raise SystemExit(f"Unknown scenario {scenario!r} in --mix")
+        weights[scenario.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+async def drive(workload: Workload, args, requests: int, latencies: Dict[str, List[float]], errors: Dict[str, int]):
+    """Run `requests` requests of the mix with `args.concurrency` workers, each with its own users."""
+    mix = parse_mix(args.mix)
+    scenarios = [getattr(workload, name) for name in mix]
+    cum_weights = list(accumulate(mix.values()))
+    user_ids = list(workload.db.graph.users)
+    remaining = requests
+
+    async def worker(index: int) -> None:
+        nonlocal remaining
+        rng = random.Random(args.seed + index)
+        """A user belongs to one worker only, so its like/unlike requests never race."""
+        own_users = user_ids[index::args.concurrency] or user_ids
+        while remaining > 0:
+            remaining -= 1
+            scenario = rng.choices(scenarios, cum_weights=cum_weights)[0]
+            start = time.perf_counter()
+            label, status = await scenario(rng, rng.choice(own_users))
+            latencies[label].append(time.perf_counter() - start)
+            if status >= 400:
+                errors[label] += 1
+
+    await asyncio.gather(*(worker(index) for index in range(args.concurrency)))
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, Dict[str, Any]]:
+    routes = {}
+    everything = sorted(value for values in latencies.values() for value in values)
+    for label, values in sorted(latencies.items()) + [("TOTAL", everything)]:
+        ordered = sorted(values)
+        routes[label] = {
+            "count": len(ordered),
+            "errors": errors.get(label, 0) if label != "TOTAL" else sum(errors.values()),
+            **{name: percentile(ordered, q) * 1000 for name, q in PERCENTILES},
+            "rps": len(ordered) / elapsed,
+        }
+    return routes
+
+
+def print_report(routes: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'route':<40}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for label, stats in routes.items():
+        print(
+            f"{label:<40}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['rps']:>10.0f}"
+        )
+
+
+def machine() -> Dict[str, Any]:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def compare(routes: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float, min_delta: float) -> bool:
+    """Print the change of every percentile against the baseline, return False if any route regressed."""
+    ok = True
+    print(f"\n{'route':<40}" + "".join(f"{name + ' change':>14}" for name, _ in PERCENTILES))
+    for label, stats in routes.items():
+        before = baseline["routes"].get(label)
+        if before is None:
+            print(f"{label:<40}{'new route':>14}")
+            continue
+        line, regressed = f"{label:<40}", False
+        for name, _ in PERCENTILES:
+            change = stats[name] / before[name] - 1 if before[name] else 0.0
+            line += f"{change:>+14.1%}"
+            if change > tolerance and stats[name] - before[name] > min_delta:
+                regressed = True
+        print(line + ("  REGRESSION" if regressed else ""))
+        ok = ok and not regressed
+    return ok
+
+
+async def main(args) -> int:
+    started = time.perf_counter()
+    graph = seed_graph(args.users, args.restaurants, pwd_context.hash(PASSWORD), args.seed)
+    db = StandInDatabase(graph, latency=args.latency / 1000, jitter=args.jitter / 1000, seed=args.seed)
+
+    async def get_standin_db() -> StandInDatabase:
+        return db
+
+    app.dependency_overrides[get_db] = get_standin_db
+    tokens = {user_id: create_access_token({"sub": user_id}, timedelta(hours=1)) for user_id in graph.users}
+    workload = Workload(ASGIClient(app), db, tokens)
+    print(f"Seeded {args.users} users and {args.restaurants} restaurants in {time.perf_counter() - started:.1f}s")
+
+    if args.warmup:
+        await drive(workload, args, args.warmup, defaultdict(list), defaultdict(int))
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    started = time.perf_counter()
+    await drive(workload, args, args.requests, latencies, errors)
+    elapsed = time.perf_counter() - started
+
+    routes = summarize(latencies, errors, elapsed)
+    modes = ", ".join(f"{name}={mode}" for name, mode in sorted(db.access_modes.items()))
+    print(f"Query access modes: {modes}")
+    print(f"{args.requests} requests, concurrency {args.concurrency}, query latency {args.latency}ms, {elapsed:.1f}s\n")
+    print_report(routes)
+
+    run = {"machine": machine(), "args": vars(args), "routes": routes}
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(run, file, indent=2)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("machine") != run["machine"]:
+            print(f"\nWarning: the baseline was made on {baseline.get('machine')}, not on this machine")
+        changed = {
+            key: value for key, value in baseline["args"].items()
+            if key not in ("save", "compare", "tolerance", "min_delta") and run["args"].get(key) != value
+        }
+        if changed:
+            print(f"Warning: the baseline was made with other parameters: {changed}")
+        if not compare(routes, baseline, args.tolerance, args.min_delta):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=500, help="Requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--restaurants", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=1.0, help="Stand-in query latency, ms")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Random extra query latency up to, ms")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results to this JSON file, e.g. as the baseline")
+    parser.add_argument("--compare", help="Baseline JSON file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, 0.2 is 20%%")
+    parser.add_argument("--min-delta", type=float, default=0.5, help="Slowdowns smaller than this many ms are noise")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,111 @@
+"""Latency of GET /restaurants/nearby queries on a live Neo4j with ~100k restaurants.
+
+Seeds restaurants marked with `benchmark: true` around a city, makes sure the schema
+(including the Restaurant.geo index) is applied, times `nearby_restaurants` for random
+centers against the same query forced to scan the label, and removes the seeded
+restaurants. Uses the Neo4j configured in `.env`:
+
+    python -m benchmarks.nearby --restaurants 100000 --queries 500
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from neo4j.spatial import WGS84Point
+
+from src.core.db import db
+from src.core.schema import apply_schema
+from src.restaurants.services import nearby_restaurants
+
+
+"""The query of `nearby_restaurants` with the geo index disabled by a planner hint."""
+SCAN_QUERY = """
+    MATCH (res:Restaurant) USING SCAN res:Restaurant
+    WHERE distance(res.geo, $center) <= $radius AND coalesce(res.active, true)
+    WITH res, distance(res.geo, $center) AS distance
+    RETURN res, distance
+    ORDER BY distance, res.id
+    LIMIT $limit
+"""
+
+
+async def seed(count: int, center: tuple, spread: float, batch_size: int, rng: random.Random) -> None:
+    query = """
+        UNWIND $rows AS row
+        CREATE (res:Restaurant {
+            id: row.id, name: row.id, active: true, likes: 0, benchmark: true,
+            created_at: row.created_at,
+            geo: point({latitude: row.latitude, longitude: row.longitude})
+        })
+    """
+    for start in range(0, count, batch_size):
+        rows = [
+            {
+                "id": f"benchmark-{number}",
+                "created_at": f"2021-01-01 00:00:00.{number:06d}",
+                "latitude": center[0] + rng.uniform(-spread, spread),
+                "longitude": center[1] + rng.uniform(-spread, spread),
+            }
+            for number in range(start, min(start + batch_size, count))
+        ]
+        await db.run(query, {"rows": rows}, name="benchmark.seed")
+
+
+async def cleanup(batch_size: int) -> None:
+    query = """
+        MATCH (res:Restaurant) WHERE res.benchmark = true
+        WITH res LIMIT $batch_size
+        DETACH DELETE res
+        RETURN count(*) AS deleted
+    """
+    while (await db.run(query, {"batch_size": batch_size}, name="benchmark.cleanup"))[0]["deleted"]:
+        pass
+
+
+async def main(args) -> None:
+    rng = random.Random(args.seed)
+    center = (50.45, 30.52)
+    await db.connect()
+    try:
+        await apply_schema(db)
+        started = time.perf_counter()
+        await seed(args.restaurants, center, args.spread, args.batch_size, rng)
+        print(f"seeded {args.restaurants} restaurants in {time.perf_counter() - started:.1f}s")
+
+        centers = [
+            (center[0] + rng.uniform(-args.spread, args.spread), center[1] + rng.uniform(-args.spread, args.spread))
+            for _ in range(args.queries)
+        ]
+        indexed, scanned = [], []
+        for latitude, longitude in centers:
+            started = time.perf_counter()
+            await nearby_restaurants(db, latitude, longitude, args.radius, args.limit)
+            indexed.append((time.perf_counter() - started) * 1000)
+        for latitude, longitude in centers[:args.scan_queries]:
+            parameters = {"center": WGS84Point((longitude, latitude)), "radius": args.radius, "limit": args.limit}
+            started = time.perf_counter()
+            await db.run(SCAN_QUERY, parameters, name="benchmark.nearby_scan")
+            scanned.append((time.perf_counter() - started) * 1000)
+
+        print(f"radius={args.radius}m, limit={args.limit}")
+        for label, latencies in (("index", indexed), ("scan", scanned)):
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"{label:>6}: p50 {quantiles[49]:.1f} ms, p95 {quantiles[94]:.1f} ms, p99 {quantiles[98]:.1f} ms")
+    finally:
+        await cleanup(args.batch_size)
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--scan-queries", type=int, default=50)
+    parser.add_argument("--radius", type=float, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=0.5, help="Degrees around the center")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""Benchmark of the restaurant similarity index on a synthetic likes graph.
+
+Builds the index from ~100k users / 10k restaurants with skewed popularity,
+then times recommendations for a sample of users:
+
+    python -m benchmarks.recommendations --users 100000 --restaurants 10000
+"""
+import time
+import random
+import argparse
+import statistics
+from itertools import accumulate
+
+from src.restaurants.recommendations import SimilarityIndex
+
+
+def synthetic_likes(users: int, restaurants: int, min_likes: int, max_likes: int, seed: int):
+    rng = random.Random(seed)
+    restaurant_ids = [f"restaurant-{i}" for i in range(restaurants)]
+    """Zipf-like popularity: a few restaurants get most of the likes."""
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(restaurants)))
+    return [
+        rng.choices(restaurant_ids, cum_weights=cum_weights, k=rng.randint(min_likes, max_likes))
+        for _ in range(users)
+    ]
+
+
+def main(args) -> None:
+    started = time.perf_counter()
+    likes_by_user = synthetic_likes(args.users, args.restaurants, args.min_likes, args.max_likes, args.seed)
+    edges = sum(len(liked) for liked in likes_by_user)
+    print(f"generated {args.users} users, {args.restaurants} restaurants, {edges} likes "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    index = SimilarityIndex(top_k=args.top_k)
+    started = time.perf_counter()
+    index.neighbours = index.compute(likes_by_user, args.top_k)
+    print(f"refresh: {time.perf_counter() - started:.1f}s for {len(index.neighbours)} restaurants")
+
+    rng = random.Random(args.seed)
+    sample = rng.sample(likes_by_user, min(args.requests, len(likes_by_user)))
+    latencies = []
+    for liked in sample:
+        started = time.perf_counter()
+        index.recommend(liked, args.limit)
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"recommend (limit={args.limit}): p50 {quantiles[49]:.0f} us, "
+          f"p95 {quantiles[94]:.0f} us, p99 {quantiles[98]:.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--restaurants", type=int, default=10_000)
+    parser.add_argument("--min-likes", type=int, default=2)
+    parser.add_argument("--max-likes", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""Per-row cost of turning restaurant rows into a JSON response body.
+
+Builds the rows `list_restaurants` and `top_restaurants` return for a 10k-restaurant list and
+times, per row:
+
+  validated  Page[RestaurantPartial] / List[Restaurant] + jsonable_encoder + json.dumps
+  trusted    `trusted_restaurant` + json.dumps
+  trusted+   `trusted_restaurant` + `src.core.responses.dumps` (orjson if installed)
+
+    python -m benchmarks.serialization --restaurants 10000 --repeat 5
+"""
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from neo4j.spatial import WGS84Point
+
+from src.core import responses
+from src.core.schemas import Page
+from src.restaurants.schemas import Restaurant, RestaurantPartial
+from src.restaurants.services import RESTAURANT_FIELDS, trusted_restaurant
+
+
+def restaurant_rows(count: int, seed: int):
+    rng = random.Random(seed)
+    started = datetime(2021, 1, 1)
+    return [
+        {
+            "id": f"restaurant-{i}",
+            "name": f"Restaurant {i}",
+            "about": "A place to eat " * rng.randint(1, 10),
+            "phone_number": "+380 44 000 00 00",
+            "address": f"{i} Main street",
+            "geo": WGS84Point((30.5 + rng.random(), 50.4 + rng.random())),
+            "email": f"restaurant-{i}@example.com",
+            "cuisine": rng.choice(["italian", "japanese", "mexican", "indian"]),
+            "active": True,
+            "created_at": str(started + timedelta(seconds=i, microseconds=rng.randint(1, 999999))),
+            "image": None,
+            "likes": rng.randint(0, 1000),
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat: int, func: Callable[[], bytes]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(args) -> None:
+    rows = restaurant_rows(args.restaurants, args.seed)
+    """GET /restaurants items hold exactly the selected fields, /top items are whole nodes."""
+    items = [{field: row.get(field) for field in RESTAURANT_FIELDS} for row in rows]
+
+    def validated_list():
+        page = Page[RestaurantPartial](items=items, next_cursor=None)
+        return json.dumps(jsonable_encoder(page, exclude_unset=True)).encode()
+
+    def trusted_list(dumps=lambda content: json.dumps(content).encode()):
+        return dumps({"items": [trusted_restaurant(item, RESTAURANT_FIELDS) for item in items], "next_cursor": None})
+
+    def validated_top():
+        return json.dumps(jsonable_encoder([Restaurant(**row) for row in rows])).encode()
+
+    def trusted_top(dumps=lambda content: json.dumps(content).encode()):
+        return dumps([trusted_restaurant(row) for row in rows])
+
+    """Both paths must produce the same document."""
+    assert json.loads(validated_list()) == json.loads(trusted_list())
+    assert json.loads(validated_top()) == json.loads(trusted_top())
+
+    encoder = "orjson" if responses.orjson is not None else "json, orjson is not installed"
+    print(f"{args.restaurants} restaurants, best of {args.repeat}, fast encoder: {encoder}")
+    for endpoint, validated, trusted in (
+        ("GET /restaurants", validated_list, trusted_list),
+        ("GET /restaurants/top", validated_top, trusted_top),
+    ):
+        timings = {
+            "validated": best_of(args.repeat, validated),
+            "trusted": best_of(args.repeat, trusted),
+            "trusted+": best_of(args.repeat, lambda: trusted(responses.dumps)),
+        }
+        print(endpoint)
+        for label, elapsed in timings.items():
+            per_row = elapsed / args.restaurants * 1e6
+            print(f"  {label:>9}: {per_row:7.2f} us/row  {timings['validated'] / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--restaurants", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,284 @@
+"""In-process stand-in for `src.core.db.Database`, backed by an in-memory graph.
+
+Answers the named queries the benchmarked routes run (see the `name` passed to `Database.run`),
+after an injectable latency, so the API can be load tested without a Neo4j server. Unknown
+query names raise, which points at the handler to add when a benchmarked route changes.
+"""
+import asyncio
+import random
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from neo4j import READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import ConstraintError
+
+from src.core.bookmarks import current_bookmarks
+
+
+Rows = List[Dict[str, Any]]
+
+
+class InMemoryGraph:
+    """Users and restaurants by id, and LIKES edges as (user id, restaurant id) -> liked_at."""
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.user_emails: Dict[str, str] = {}
+        self.restaurants: Dict[str, Dict[str, Any]] = {}
+        self.restaurant_names: Dict[str, str] = {}
+        self.likes: Dict[Tuple[str, str], str] = {}
+        self._ordered: Optional[Tuple[List[Tuple[str, str]], List[Dict[str, Any]]]] = None
+
+    def add_user(self, user: Dict[str, Any]) -> None:
+        self.users[user["id"]] = user
+        self.user_emails[user["email"]] = user["id"]
+
+    def add_restaurant(self, restaurant: Dict[str, Any]) -> None:
+        if restaurant["name"] in self.restaurant_names:
+            raise ConstraintError(f"Restaurant with name '{restaurant['name']}' already exists")
+        self.restaurants[restaurant["id"]] = restaurant
+        self.restaurant_names[restaurant["name"]] = restaurant["id"]
+        self._ordered = None
+
+    def ordered_restaurants(self) -> Tuple[List[Tuple[str, str]], List[Dict[str, Any]]]:
+        """(created_at, id) keys in order and the restaurants in the same order. Rebuilt after a restaurant is added."""
+        if self._ordered is None:
+            restaurants = sorted(self.restaurants.values(), key=lambda res: (res["created_at"], res["id"]))
+            self._ordered = [(res["created_at"], res["id"]) for res in restaurants], restaurants
+        return self._ordered
+
+
+class StandInDatabase:
+    """Drop-in for `Database` in `app.dependency_overrides[get_db]`.
+
+    Each query sleeps `latency` seconds, plus up to `jitter` more, before it is answered from the graph.
+    The access mode of every query name is kept in `access_modes`, and the bookmarks its last run
+    waited for in `waited_for`. Writes hand out "standin:<write number>" bookmarks to the current
+    request like a real write session does. `session` hands out sessions whose managed transactions
+    run named queries only, passed `tx` to `run`.
+    """
+
+    def __init__(self, graph: InMemoryGraph, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.graph = graph
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.queries: Dict[str, int] = {}
+        self.access_modes: Dict[str, str] = {}
+        self.waited_for: Dict[str, List[str]] = {}
+        self.writes = 0
+        self.sessions = 0
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Rows]] = {
+            "auth.get_user_by_email": self.user_by_email,
+            "loader.User.id": self.nodes_by("users", "id"),
+            "loader.Restaurant.id": self.nodes_by("restaurants", "id"),
+            "loader.Restaurant.name": self.nodes_by("restaurants", "name"),
+            "restaurants.list": self.list_restaurants,
+            "restaurants.create": self.create_restaurant,
+            "restaurants.like": self.like,
+            "restaurants.unlike": self.unlike,
+            "restaurants.apply_likes": self.apply_likes,
+            "restaurants.bulk_merge": self.bulk_merge,
+            "recommendations.load_likes": self.likes_by_user,
+        }
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def run(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        name: str = "unnamed",
+        tx: Any = None,
+        access: str = WRITE_ACCESS,
+    ) -> Rows:
+        handler = self.handlers.get(name)
+        if handler is None:
+            raise NotImplementedError(f"The stand-in database does not answer query {name!r}")
+        if tx is not None:
+            access = tx.access
+        self.queries[name] = self.queries.get(name, 0) + 1
+        self.access_modes[name] = access
+        delay = self.latency + (self.rng.random() * self.jitter if self.jitter else 0)
+        await asyncio.sleep(delay)
+        bookmarks = current_bookmarks.get()
+        self.waited_for[name] = bookmarks.for_session() if bookmarks is not None else []
+        rows = handler(parameters or {})
+        if access == WRITE_ACCESS and bookmarks is not None:
+            self.writes += 1
+            bookmarks.last = [f"standin:{self.writes}"]
+        return rows
+
+    async def read(
+        self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "unnamed"
+    ) -> Rows:
+        return await self.run(query, parameters, name, access=READ_ACCESS)
+
+    async def stream(
+        self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "unnamed", access: str = READ_ACCESS
+    ) -> AsyncIterator[Dict[str, Any]]:
+        for row in await self.run(query, parameters, name, access=access):
+            yield row
+
+    @asynccontextmanager
+    async def session(self, access: str = WRITE_ACCESS, **config) -> AsyncIterator["StandInSession"]:
+        self.sessions += 1
+        yield StandInSession(access)
+
+    def user_by_email(self, parameters: Dict[str, Any]) -> Rows:
+        user_id = self.graph.user_emails.get(parameters["email"])
+        return [{"user": self.graph.users[user_id]}] if user_id else []
+
+    def nodes_by(self, collection: str, key: str) -> Callable[[Dict[str, Any]], Rows]:
+        def handler(parameters: Dict[str, Any]) -> Rows:
+            nodes = getattr(self.graph, collection)
+            if key == "id":
+                found = (nodes.get(value) for value in parameters["values"])
+            else:
+                found = (nodes.get(self.graph.restaurant_names.get(value, "")) for value in parameters["values"])
+            return [{"node": node} for node in found if node is not None]
+        return handler
+
+    def list_restaurants(self, parameters: Dict[str, Any]) -> Rows:
+        """Same semantics as the query built by `list_restaurants`: exact filters, keyset on (created_at, id)."""
+        filters = {key: value for key, value in parameters.items() if key != "limit" and not key.startswith("after_")}
+        keys, ordered = self.graph.ordered_restaurants()
+        start = 0
+        if "after_id" in parameters:
+            start = bisect_right(keys, (parameters["after_created_at"], parameters["after_id"]))
+        rows = []
+        for index in range(start, len(ordered)):
+            res = ordered[index]
+            if all(res.get(key) == value for key, value in filters.items()):
+                rows.append({"res": res, "created_at": res["created_at"], "id": res["id"]})
+                if len(rows) == parameters["limit"]:
+                    break
+        return rows
+
+    def create_restaurant(self, parameters: Dict[str, Any]) -> Rows:
+        restaurant = dict(parameters["params"])
+        self.graph.add_restaurant(restaurant)
+        return [{"res": restaurant}]
+
+    def bulk_merge(self, parameters: Dict[str, Any]) -> Rows:
+        results = []
+        for row in parameters["rows"]:
+            created = row["name"] not in self.graph.restaurant_names
+            if created:
+                self.graph.add_restaurant(dict(row))
+            results.append({"id": row["id"], "created": created})
+        return results
+
+    def like(self, parameters: Dict[str, Any]) -> Rows:
+        user_id, restaurant_id = parameters["user_id"], parameters["restaurant_id"]
+        restaurant = self.graph.restaurants.get(restaurant_id)
+        if user_id not in self.graph.users or restaurant is None:
+            return []
+        if (user_id, restaurant_id) not in self.graph.likes:
+            self.graph.likes[user_id, restaurant_id] = parameters["liked_at"]
+            restaurant["likes"] = (restaurant.get("likes") or 0) + 1
+        liked_at = self.graph.likes[user_id, restaurant_id]
+        return [{"r": {"liked_at": liked_at}, **self.like_counts(restaurant)}]
+
+    def unlike(self, parameters: Dict[str, Any]) -> Rows:
+        user_id, restaurant_id = parameters["user_id"], parameters["restaurant_id"]
+        if self.graph.likes.pop((user_id, restaurant_id), None) is None:
+            return []
+        restaurant = self.graph.restaurants[restaurant_id]
+        restaurant["likes"] = max(restaurant.get("likes", 0) - 1, 0)
+        return [{"u": self.graph.users[user_id], **self.like_counts(restaurant)}]
+
+    def apply_likes(self, parameters: Dict[str, Any]) -> Rows:
+        user_id = parameters["user_id"]
+        if user_id not in self.graph.users:
+            return []
+        rows = []
+        for operation in parameters["operations"]:
+            restaurant_id = operation["restaurant_id"]
+            restaurant = self.graph.restaurants.get(restaurant_id)
+            existed = (user_id, restaurant_id) in self.graph.likes
+            if operation["add"] and restaurant is not None and not existed:
+                self.graph.likes[user_id, restaurant_id] = parameters["liked_at"]
+                restaurant["likes"] = (restaurant.get("likes") or 0) + 1
+            elif not operation["add"] and existed:
+                del self.graph.likes[user_id, restaurant_id]
+                restaurant["likes"] = max((restaurant.get("likes") or 0) - 1, 0)
+            rows.append({
+                "restaurant_id": restaurant_id,
+                "found": restaurant is not None,
+                "existed": existed,
+                **self.like_counts(restaurant or {}),
+            })
+        return rows
+
+    def likes_by_user(self, parameters: Dict[str, Any]) -> Rows:
+        liked: Dict[str, List[str]] = {}
+        for user_id, restaurant_id in self.graph.likes:
+            liked.setdefault(user_id, []).append(restaurant_id)
+        return [{"user_id": user_id, "liked": restaurant_ids} for user_id, restaurant_ids in liked.items()]
+
+    @staticmethod
+    def like_counts(restaurant: Dict[str, Any]) -> Dict[str, Any]:
+        """The `likes`, `cuisine` and `active` columns like and unlike queries return."""
+        return {
+            "likes": restaurant.get("likes") or 0,
+            "cuisine": restaurant.get("cuisine"),
+            "active": restaurant.get("active", True),
+        }
+
+
+class StandInTransaction:
+    """Only carries the access mode of its session, queries go through `StandInDatabase.run(..., tx=tx)`."""
+
+    def __init__(self, access: str):
+        self.access = access
+
+    async def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, **kwargs):
+        raise NotImplementedError("The stand-in database answers named queries only, use `Database.run(..., tx=tx)`")
+
+
+class StandInSession:
+    """Managed transactions of a stand-in session, like `neo4j.AsyncSession` ones but never retried."""
+
+    def __init__(self, access: str):
+        self.access = access
+
+    async def execute_read(self, work: Callable, *args, **kwargs) -> Any:
+        return await work(StandInTransaction(READ_ACCESS), *args, **kwargs)
+
+    async def execute_write(self, work: Callable, *args, **kwargs) -> Any:
+        return await work(StandInTransaction(WRITE_ACCESS), *args, **kwargs)
+
+
+def seed_graph(users: int, restaurants: int, password_hash: str, seed: int = 0) -> InMemoryGraph:
+    """`users` users (user-N, bench-N@example.com) sharing `password_hash`, and `restaurants` restaurants."""
+    rng = random.Random(seed)
+    graph = InMemoryGraph()
+    joined = str(datetime(2021, 11, 1))
+    for i in range(users):
+        graph.add_user({
+            "id": f"user-{i}",
+            "email": f"bench-{i}@example.com",
+            "name": f"Bench {i}",
+            "is_active": True,
+            "joined": joined,
+            "hashed_password": password_hash,
+        })
+    cuisines = ["italian", "japanese", "mexican", "indian", "french", "georgian"]
+    for i in range(restaurants):
+        graph.add_restaurant({
+            "id": f"restaurant-{i}",
+            "name": f"Restaurant {i}",
+            "about": "A place to eat",
+            "cuisine": rng.choice(cuisines),
+            "active": True,
+            "likes": 0,
+            "created_at": str(datetime(2021, 1, 1) + timedelta(seconds=i)),
+        })
+    return graph
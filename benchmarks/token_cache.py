@@ -0,0 +1,65 @@
+"""Micro-benchmark of `get_current_user` with and without the verified token cache.
+
+Run from the project root (the usual `.env` is needed for settings):
+
+    python -m benchmarks.token_cache --iterations 20000
+"""
+import asyncio
+import argparse
+import time
+from datetime import timedelta
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from src.auth import services
+from src.core.loader import Loaders
+from src.auth.services import create_access_token, get_current_user
+
+
+class StaticUserDatabase:
+    """Answers every query with the same user, so only the token handling is measured."""
+
+    def __init__(self, user_id: str):
+        self.user = {
+            "id": user_id,
+            "email": "bench@example.com",
+            "name": "Bench",
+            "is_active": True,
+            "joined": "2021-11-01 00:00:00",
+            "hashed_password": "not-a-real-hash",
+        }
+
+    async def read(self, query, parameters=None, name="unnamed"):
+        return [{"node": self.user}]
+
+
+async def resolve(credentials, db, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await get_current_user(credentials, Loaders(db))
+    return time.perf_counter() - start
+
+
+async def main(iterations: int) -> None:
+    user_id = "benchmark-user"
+    token = create_access_token({"sub": user_id}, expires_delta=timedelta(minutes=10))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    db = StaticUserDatabase(user_id)
+
+    token_cache_size = services.token_cache.maxsize
+    services.token_cache.maxsize = 0
+    uncached = await resolve(credentials, db, iterations)
+
+    services.token_cache.maxsize = token_cache_size or 1
+    cached = await resolve(credentials, db, iterations)
+
+    for label, elapsed in (("uncached", uncached), ("cached", cached)):
+        print(f"{label:>9}: {elapsed / iterations * 1e6:8.2f} us/call ({iterations / elapsed:10.0f} calls/s)")
+    print(f"  speedup: {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
@@ -1,14 +1,15 @@
 from uuid import uuid4
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from email_validator import validate_email, EmailNotValidError
+from neo4j.exceptions import ConstraintError
 
-from src.core.db import neo4j_driver
+from src.core.db import Database, get_db
 from src.users.schemas import User, UserSignIn, UserSignInResponse, UserSignUp, UserResetPassword
 from src.auth.services import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    create_password_hash, check_user_exists, authenticate_user, create_access_token,
+    create_password_hash, check_user_exists, authenticate_user, create_access_token, user_cache,
 )
 
 
@@ -16,7 +17,7 @@ router = APIRouter()
 
 
 @router.post("/sign-up", status_code=status.HTTP_200_OK, response_model=User)
-async def sign_up(new_user: UserSignUp):
+async def sign_up(new_user: UserSignUp, db: Database = Depends(get_db)):
     try:
         valid = validate_email(new_user.email)
         """Update with the normalized form."""
@@ -31,7 +32,7 @@ async def sign_up(new_user: UserSignUp):
     attributes = {
         "id": str(uuid4()),
         "email": email,
-        "hashed_password": create_password_hash(new_user.password),
+        "hashed_password": await create_password_hash(new_user.password),
         "joined": str(datetime.utcnow()),
         "is_active": True
     }
@@ -42,23 +43,23 @@ async def sign_up(new_user: UserSignUp):
     attributes.update(new_user)
 
     query_create_new_user = "CREATE (user:User $attributes) RETURN user"
-    with neo4j_driver.session() as session:
-        if check_user_exists(email):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Operation not permitted, user with email {email} already exists.",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        new_user_create = session.run(query_create_new_user, attributes=attributes)
-        new_user_data = new_user_create.data()[0]["user"]
+    try:
+        new_user_create = await db.run(query_create_new_user, {"attributes": attributes}, name="auth.sign_up")
+    except ConstraintError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Operation not permitted, user with email {email} already exists.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    new_user_data = new_user_create[0]["user"]
 
     return User(**new_user_data)
 
 
 @router.post("/sign-in", status_code=status.HTTP_200_OK, response_model=UserSignInResponse)
-async def sign_in(user: UserSignIn):
+async def sign_in(user: UserSignIn, db: Database = Depends(get_db)):
     """Endpoint for token authentication."""
-    user = authenticate_user(user.email, user.password)
+    user = await authenticate_user(db, user.email, user.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -81,7 +82,7 @@ async def sign_in(user: UserSignIn):
 
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK)
-async def reset_password(user_reset_pass: UserResetPassword):
+async def reset_password(user_reset_pass: UserResetPassword, db: Database = Depends(get_db)):
     """Reset User's password using user's email."""
 
     email, new_password = user_reset_pass.email, user_reset_pass.new_password
@@ -100,13 +101,15 @@ async def reset_password(user_reset_pass: UserResetPassword):
         SET user.hashed_password = $new_password_hash
         RETURN user
     """
-    with neo4j_driver.session() as session:
-        """Checking if user exists, if not - raise 404."""
-        if not check_user_exists(email):
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-        """Encrypt new password and update user's property."""
-        new_password_hash = create_password_hash(new_password)
-        session.run(query_reset_password, email=email, new_password_hash=new_password_hash)
+    """Checking if user exists, if not - raise 404."""
+    if not await check_user_exists(db, email):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    """Encrypt new password and update user's property."""
+    new_password_hash = await create_password_hash(new_password)
+    parameters = {"email": email, "new_password_hash": new_password_hash}
+    updated_users = await db.run(query_reset_password, parameters, name="auth.reset_password")
+    for updated_user in updated_users:
+        user_cache.delete(updated_user["user"]["id"])
 
     return {"detail": "Password successfully updated"}
@@ -1,3 +1,7 @@
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -7,7 +11,10 @@ from passlib.context import CryptContext
 from jose import jwt, JWTError
 
 from src.settings import settings
-from src.core.db import neo4j_driver
+from src.core.cache import TTLCache
+from src.core.db import Database
+from src.core.loader import Loaders, get_loaders
+from src.core.metrics import auth_duration
 from src.users.schemas import User, UserInDB
 
 
@@ -15,70 +22,102 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = int(settings.access_token_expire_minutes)
 
+"""Users resolved by get_current_user, by id. Invalidate on every write to a user."""
+user_cache = TTLCache("users", maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
+
+"""Claims of already verified tokens, by sha256 of the token. Raw tokens are never stored."""
+token_cache = TTLCache(
+    "tokens",
+    maxsize=settings.token_cache_size if settings.token_cache_enabled else 0,
+    ttl=settings.token_cache_ttl
+)
+
 
 """Generate password hash."""
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+"""bcrypt is slow on purpose, keep it off the event loop."""
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash"
+)
+password_jobs = 0
+
+
+async def run_password_job(func, *args):
+    """Run a hashing function in the password pool, or raise 503 if the pool is saturated."""
+    global password_jobs
+    if password_jobs >= settings.password_hash_workers + settings.password_hash_queue_size:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"}
+        )
+    password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        password_jobs -= 1
+
 
-def create_password_hash(password):
-    return pwd_context.hash(password)
+async def create_password_hash(password):
+    return await run_password_job(pwd_context.hash, password)
 
 
-def verify_password(plain_password, password_hash):
-    return pwd_context.verify(plain_password, password_hash)
+async def verify_password(plain_password, password_hash):
+    return await run_password_job(pwd_context.verify, plain_password, password_hash)
 
 
-def check_user_exists(unique_attr: str):
+async def check_user_exists(db: Database, unique_attr: str):
     query_by_email = "MATCH (user:User) WHERE user.email = $email RETURN user"
     query_by_id = "MATCH (user:User) WHERE user.id = $user_id RETURN user"
 
-    with neo4j_driver.session() as session:
-        if "@" in unique_attr:
-            user_in_db = session.run(query_by_email, email=unique_attr)
-        else:
-            user_in_db = session.run(query_by_id, user_id=unique_attr)
-        if user_in_db.data():
-            return True
-        return False
+    if "@" in unique_attr:
+        user_in_db = await db.read(query_by_email, {"email": unique_attr}, name="auth.user_exists_by_email")
+    else:
+        user_in_db = await db.read(query_by_id, {"user_id": unique_attr}, name="auth.user_exists_by_id")
+    if user_in_db:
+        return True
+    return False
 
 
-def get_user(user: str):
+async def get_user(db: Database, user: str):
     """Search the database for user.
 
      For sign-in, searching is by email.
-     For function get_current_user, searching is by id.
+     Lookups by id of the current request should rather go through `Loaders.users`.
      """
     query_id = "MATCH (user:User) WHERE user.id = $user_id RETURN user"
     query_email = "MATCH (user:User) WHERE user.email = $email RETURN user"
 
-    with neo4j_driver.session() as session:
-        if "@" in user:
-            user_in_db = session.run(query_email, email=user)
-        else:
-            user_in_db = session.run(query_id, user_id=user)
+    if "@" in user:
+        user_in_db = await db.read(query_email, {"email": user}, name="auth.get_user_by_email")
+    else:
+        user_in_db = await db.read(query_id, {"user_id": user}, name="auth.get_user_by_id")
 
-        try:
-            user_data = user_in_db.data()[0]["user"]
-        except IndexError as err:
-            print(f"Err: {err}")
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Operation not permitted, wrong id or email provided: '{user}'",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        return UserInDB(**user_data)
-
-
-def authenticate_user(email, password):
+    try:
+        user_data = user_in_db[0]["user"]
+    except IndexError as err:
+        print(f"Err: {err}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Operation not permitted, wrong id or email provided: '{user}'",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return UserInDB(**user_data)
+
+
+async def authenticate_user(db: Database, email, password):
     """Authenticate user by checking they exist and that the password is correct."""
-    user = get_user(email)
+    user = await get_user(db, email)
     if not user:
         return False
 
     """If present, verify password against password hash in database."""
     password_hash = user.hashed_password
 
-    if not verify_password(password, password_hash):
+    if not await verify_password(password, password_hash):
         return False
     return user
 
@@ -95,25 +134,52 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(HTTPBearer())):
+def decode_access_token(token: str) -> dict:
+    """Verify the token and return its claims, skipping verification for recently seen tokens.
+
+    Raises JWTError if the token is not valid.
+    """
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        expire = payload.get("exp")
+        token_cache.set(digest, payload, ttl=expire - time.time() if expire else None)
+    return payload
+
+
+def forget_access_token(token: str) -> None:
+    """Drop the verified claims of the token, the next request verifies it again."""
+    token_cache.delete(hashlib.sha256(token.encode()).hexdigest())
+
+
+async def get_current_user(token: str = Depends(HTTPBearer()), loaders: Loaders = Depends(get_loaders)):
     """Decrypt the token and retrieve the user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    token = token.credentials
+    start = time.perf_counter()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        token = token.credentials
+        try:
+            payload = decode_access_token(token)
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = get_user(user=user_id)
-    if user is None:
-        raise credentials_exception
-    return user
+        user = user_cache.get(user_id)
+        if user is None:
+            user_data = await loaders.users.load(user_id)
+            if user_data is None:
+                raise credentials_exception
+            user = UserInDB(**user_data)
+            user_cache.set(user_id, user)
+        return user
+    finally:
+        auth_duration.observe(time.perf_counter() - start)
 
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -121,3 +187,10 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return current_user
+
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+    """Check that current user is an admin and return the user."""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
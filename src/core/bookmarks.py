@@ -0,0 +1,90 @@
+"""Causal consistency across requests with Neo4j bookmarks.
+
+A client that wrote something gets the bookmark of its last write in the `X-Neo4j-Bookmark`
+response header. Sending it back in the same request header makes the sessions of the next
+request wait until the server they run on has caught up with that write, so reads routed to
+a follower or read replica still see it.
+"""
+import re
+from contextvars import ContextVar
+from typing import List, Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+
+BOOKMARK_HEADER = "X-Neo4j-Bookmark"
+"""Every session of the request waits for all the received bookmarks, keep them few and short."""
+MAX_BOOKMARKS = 8
+MAX_BOOKMARK_LENGTH = 256
+"""Printable ASCII without spaces, as the bookmarks Neo4j hands out."""
+BOOKMARK = re.compile(rf"[!-~]{{1,{MAX_BOOKMARK_LENGTH}}}")
+
+"""Server errors caused by bookmarks the client sent: malformed or of another database, or one the
+server did not catch up with in time (e.g. a made up future one)."""
+BOOKMARK_ERRORS = {
+    "Neo.ClientError.Transaction.InvalidBookmark",
+    "Neo.ClientError.Transaction.InvalidBookmarkMixture",
+    "Neo.TransientError.Transaction.BookmarkTimeout",
+}
+
+
+class BookmarkError(Exception):
+    """The request's bookmarks were rejected by the server, see `BOOKMARK_ERRORS`."""
+
+
+class RequestBookmarks:
+    """Bookmarks of one HTTP request: the ones the client sent and the ones of the request's last write."""
+
+    def __init__(self, received: List[str]):
+        self.received = received
+        self.last: List[str] = []
+
+    def for_session(self) -> List[str]:
+        """Bookmarks a new session must wait for, the request's own writes included."""
+        return self.received + self.last
+
+
+"""Set for each request by `BookmarkMiddleware`. Holds an object, not the bookmarks themselves,
+so that sessions opened in tasks spawned by the request (they get a copy of the context) can update it."""
+current_bookmarks: ContextVar[Optional[RequestBookmarks]] = ContextVar("current_bookmarks", default=None)
+
+
+class BookmarkMiddleware:
+    """Read bookmarks from the request header and return the bookmark of the last write in the response one."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        received = [
+            bookmark.strip()
+            for value in Headers(scope=scope).getlist(BOOKMARK_HEADER)
+            for bookmark in value.split(",")
+            if bookmark.strip()
+        ]
+        if len(received) > MAX_BOOKMARKS or not all(BOOKMARK.fullmatch(bookmark) for bookmark in received):
+            response = JSONResponse(
+                {"detail": f"{BOOKMARK_HEADER} takes at most {MAX_BOOKMARKS} comma separated bookmarks "
+                           f"of at most {MAX_BOOKMARK_LENGTH} printable characters."},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+            await response(scope, receive, send)
+            return
+        bookmarks = RequestBookmarks(received)
+
+        async def send_with_bookmark(message):
+            if message["type"] == "http.response.start" and bookmarks.last:
+                MutableHeaders(scope=message).append(BOOKMARK_HEADER, ",".join(bookmarks.last))
+            await send(message)
+
+        token = current_bookmarks.set(bookmarks)
+        try:
+            await self.app(scope, receive, send_with_bookmark)
+        finally:
+            current_bookmarks.reset(token)
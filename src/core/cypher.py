@@ -1,20 +1,109 @@
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, status
+from neo4j import READ_ACCESS, unit_of_work
+from neo4j.exceptions import ClientError
 
-from src.core.db import neo4j_driver
+from src.auth.services import get_current_admin_user
+from src.core.db import Database, get_db
+from src.core.profiling import plan_operators
 from src.core.schemas import Query
+from src.settings import settings
+from src.users.schemas import User
 
 
 router = APIRouter()
 
+"""Queries of each user running right now."""
+running: Dict[str, int] = defaultdict(int)
+
+"""Upper bound of a variable length pattern such as [*], [*2..], [*..5] or [*3]."""
+VAR_LENGTH = re.compile(r"\*\s*(\d+)?\s*(\.\.\s*(\d+)?)?")
+
+"""shortestPath and allShortestPaths, StatefulShortestPath* with Neo4j 5."""
+SHORTEST_PATH_OPERATORS = ("ShortestPath", "StatefulShortestPath")
+
+
+def unbounded(details: str, required: bool = False) -> bool:
+    """Whether a variable length pattern in the operator details has no upper bound.
+
+    With `required`, details without any variable length pattern count as unbounded too.
+    """
+    patterns = list(VAR_LENGTH.finditer(details))
+    if required and not patterns:
+        return True
+    for bounds in patterns:
+        exact, upper_range, upper = bounds.groups()
+        if (upper_range and upper is None) or (not upper_range and exact is None):
+            return True
+    return False
+
+
+def check_plan(plan: Dict[str, Any]) -> Optional[str]:
+    """Return why the EXPLAIN plan is rejected, if it is."""
+    for operator in plan_operators(plan):
+        details = operator["details"] or ""
+        if operator["operator"].startswith("VarLengthExpand") and unbounded(details):
+            return f"Unbounded variable length expansion: {details}"
+        if operator["operator"].startswith(SHORTEST_PATH_OPERATORS) and unbounded(details, required=True):
+            return f"Unbounded shortest path: {details}"
+        if (
+            operator["operator"] == "CartesianProduct"
+            and operator["estimated_rows"] > settings.cypher_max_estimated_rows
+        ):
+            return f"Cartesian product of about {int(operator['estimated_rows'])} rows"
+    return None
+
+
+@unit_of_work(timeout=settings.cypher_timeout_seconds)
+async def _read(tx, db: Database, cypher_string: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """Return at most `cypher_max_rows` records and whether there were more."""
+    if settings.cypher_explain_check:
+        async with db.query(f"EXPLAIN {cypher_string}", name="cypher.explain", tx=tx) as result:
+            summary = await result.consume()
+        reason = check_plan(summary.plan)
+        if reason:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Query rejected. {reason}")
+
+    rows = []
+    async with db.query(cypher_string, name="cypher.raw", tx=tx) as result:
+        async for record in result:
+            if len(rows) == settings.cypher_max_rows:
+                """The rest of the result is discarded on the server when the block exits."""
+                return rows, True
+            rows.append(record.data())
+    return rows, False
+
 
 @router.get(
     "/q",
     response_model=Query,
     summary="Query the database with a custom Cypher string"
 )
-async def cypher_query(cypher_string: str):
-    with neo4j_driver.session() as session:
-        response = session.run(query=cypher_string)
-        query_response = Query(response=response.data())
-        return query_response
+async def cypher_query(
+    cypher_string: str,
+    db: Database = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Run a read only query with a server side timeout, at most `cypher_max_rows` records are returned.
+
+    Admins only: a raw query reads every property, password hashes included, and can LOAD CSV from any URL.
+    Each admin may run `cypher_max_concurrency_per_user` queries at once.
+    """
+    if running[current_user.id] >= settings.cypher_max_concurrency_per_user:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many queries running.")
+    running[current_user.id] += 1
+    try:
+        async with db.session(READ_ACCESS) as session:
+            response, truncated = await session.execute_read(_read, db, cypher_string)
+    except ClientError as err:
+        if "TransactionTimedOut" in (err.code or ""):
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Query timed out.")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err.message)
+    finally:
+        running[current_user.id] -= 1
+        if not running[current_user.id]:
+            del running[current_user.id]
+    return Query(response=response, truncated=truncated)
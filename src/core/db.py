@@ -1,8 +1,223 @@
-from neo4j import GraphDatabase
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
+from neo4j import READ_ACCESS, WRITE_ACCESS, AsyncGraphDatabase, Bookmarks
+from neo4j.exceptions import Neo4jError, ServiceUnavailable, SessionExpired
+
+from src.core.bookmarks import BOOKMARK_ERRORS, BookmarkError, current_bookmarks
+from src.core.metrics import neo4j_pool_wait, neo4j_query_duration, neo4j_query_errors
+from src.core.profiling import record_summary, should_profile
 from src.settings import settings
 
-uri = settings.neo4j_uri
-username = settings.neo4j_username
-password = settings.neo4j_password
-neo4j_driver = GraphDatabase.driver(uri, auth=(username, password))
+
+logger = logging.getLogger(__name__)
+
+"""Longest pause between two connectivity checks on startup, in seconds."""
+MAX_CONNECT_BACKOFF = 5
+
+
+class Database:
+    """Async access layer to Neo4j shared by the whole application.
+
+    The driver is opened on application startup and closed on shutdown (see `src.main`),
+    routes receive the instance through the `get_db` dependency.
+    """
+
+    def __init__(self, uri: str, username: str, password: str):
+        self.uri = uri
+        self.auth = (username, password)
+        self.driver = None
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    async def connect(self, timeout: float = settings.neo4j_startup_timeout_seconds) -> None:
+        """Create the driver and wait until Neo4j answers, for at most `timeout` seconds."""
+        if self.driver is None:
+            self.driver = AsyncGraphDatabase.driver(
+                self.uri,
+                auth=self.auth,
+                max_connection_pool_size=settings.neo4j_max_connection_pool_size,
+                connection_acquisition_timeout=settings.neo4j_connection_acquisition_timeout,
+                connection_timeout=settings.neo4j_connection_timeout,
+                max_connection_lifetime=settings.neo4j_max_connection_lifetime,
+                max_transaction_retry_time=settings.neo4j_max_transaction_retry_time,
+            )
+            """One slot per pooled connection, see `session`."""
+            self.slots = asyncio.Semaphore(settings.neo4j_max_connection_pool_size)
+        await self.wait_until_reachable(timeout)
+
+    async def wait_until_reachable(self, timeout: float) -> None:
+        """Poll `verify_connectivity` with exponential backoff, re-raise the last error after `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        delay = 0.1
+        while True:
+            try:
+                await self.driver.verify_connectivity()
+                return
+            except (ServiceUnavailable, SessionExpired) as err:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+                delay = min(delay, remaining)
+                logger.info("Neo4j is not reachable yet (%s), retrying in %.1fs", err, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_CONNECT_BACKOFF)
+
+    async def warm_up(self, connections: int) -> None:
+        """Open `connections` pooled connections now rather than on the first requests.
+
+        All the sessions are kept open until each has run its query, so each holds a connection of its own.
+        At most the pool size: one session more would wait for a free connection until the acquisition timeout.
+        """
+        pool_size = settings.neo4j_max_connection_pool_size
+        if connections > pool_size:
+            logger.warning(
+                "NEO4J_POOL_WARMUP=%d is over NEO4J_MAX_CONNECTION_POOL_SIZE, warming up %d connections",
+                connections, pool_size,
+            )
+            connections = pool_size
+        async with AsyncExitStack() as stack:
+            results = []
+            for _ in range(connections):
+                session = await stack.enter_async_context(self.driver.session())
+                results.append(await session.run("RETURN 1"))
+            for result in results:
+                await result.consume()
+
+    async def ping(self, timeout: float) -> bool:
+        """Whether Neo4j answers a trivial query within `timeout` seconds."""
+        if self.driver is None:
+            return False
+        try:
+            await asyncio.wait_for(self.run("RETURN 1", name="health.ping", access=READ_ACCESS), timeout)
+        except Exception:
+            return False
+        return True
+
+    async def close(self) -> None:
+        if self.driver is not None:
+            await self.driver.close()
+            self.driver = None
+
+    @asynccontextmanager
+    async def session(self, access: str = WRITE_ACCESS, **config) -> AsyncIterator[Any]:
+        """Open a session in READ_ACCESS or WRITE_ACCESS mode.
+
+        With a `neo4j://` URI the driver routes read sessions to followers and read replicas, and
+        write sessions to the leader. Sessions wait for the bookmarks of the current request
+        (see `src.core.bookmarks`) and write sessions record their bookmark for the response.
+        Bookmarks the server rejects or does not catch up with raise `BookmarkError`.
+        """
+        if self.driver is None:
+            raise RuntimeError("Database is not connected, call `connect()` on startup.")
+        """Waiting here means every pooled connection is busy, the time spent is exported as neo4j_pool_wait_seconds."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.slots.acquire(), settings.neo4j_connection_acquisition_timeout)
+        except asyncio.TimeoutError:
+            raise ServiceUnavailable("No free Neo4j connection within the acquisition timeout")
+        try:
+            neo4j_pool_wait.observe(time.perf_counter() - start)
+            config.setdefault("fetch_size", settings.neo4j_fetch_size)
+            if settings.neo4j_database:
+                config.setdefault("database", settings.neo4j_database)
+            bookmarks = current_bookmarks.get()
+            if bookmarks is not None:
+                config.setdefault("bookmarks", Bookmarks.from_raw_values(bookmarks.for_session()))
+                """A client bookmark the server has not reached fails with a transient error after the server's
+                bookmark wait, do not retry it while holding a connection slot."""
+                if bookmarks.received:
+                    config.setdefault("max_transaction_retry_time", 0)
+            try:
+                async with self.driver.session(default_access_mode=access, **config) as session:
+                    yield session
+                    if bookmarks is not None and access == WRITE_ACCESS:
+                        bookmarks.last = sorted((await session.last_bookmarks()).raw_values) or bookmarks.last
+            except Neo4jError as err:
+                if err.code in BOOKMARK_ERRORS:
+                    raise BookmarkError(err.message) from err
+                raise
+        finally:
+            self.slots.release()
+
+    @asynccontextmanager
+    async def query(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        name: str = "unnamed",
+        tx: Any = None,
+        access: str = WRITE_ACCESS,
+    ) -> AsyncIterator[Any]:
+        """Run a query and yield its result, every query of the project goes through here.
+
+        `name` labels the query in the metrics and logs, keep it static (never put ids or user input in it).
+        The query runs in its own `access` mode session, or in `tx` inside a transaction function. Once the block exits
+        the result is consumed: its timing and counters are recorded, slow queries are logged and a sample
+        runs with PROFILE (see `src.core.profiling`).
+        """
+        profile = should_profile(query)
+        start = time.perf_counter()
+        try:
+            async with AsyncExitStack() as stack:
+                runner = tx if tx is not None else await stack.enter_async_context(self.session(access))
+                result = await runner.run(f"PROFILE {query}" if profile else query, parameters)
+                yield result
+                summary = await result.consume()
+        except Exception:
+            neo4j_query_errors.inc(name)
+            neo4j_query_duration.observe(time.perf_counter() - start, name)
+            raise
+        duration = time.perf_counter() - start
+        neo4j_query_duration.observe(duration, name)
+        record_summary(name, query, parameters, summary, duration)
+
+    async def run(
+        self,
+        query: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        name: str = "unnamed",
+        tx: Any = None,
+        access: str = WRITE_ACCESS,
+    ) -> List[Dict[str, Any]]:
+        """Run a single query and return all the records as dicts. Reads should rather use `read`."""
+        async with self.query(query, parameters, name, tx, access) as result:
+            return await result.data()
+
+    async def read(
+        self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "unnamed"
+    ) -> List[Dict[str, Any]]:
+        """Run a read query in a managed transaction and return all the records as dicts.
+
+        Transient errors and lost connections (e.g. a leader switch) are retried by the driver
+        for up to `neo4j_max_transaction_retry_time` seconds. Every attempt is measured.
+        """
+        async def work(tx):
+            return await self.run(query, parameters, name, tx=tx)
+
+        async with self.session(READ_ACCESS) as session:
+            return await session.execute_read(work)
+
+    async def stream(
+        self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "unnamed", access: str = READ_ACCESS
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run a query and yield records as dicts while they are fetched, without buffering the result.
+
+        The measured duration includes the time the consumer spends between records.
+        """
+        async with self.query(query, parameters, name, access=access) as result:
+            async for record in result:
+                yield record.data()
+
+
+db = Database(settings.neo4j_uri, settings.neo4j_username, settings.neo4j_password)
+
+
+async def get_db() -> Database:
+    """FastAPI dependency returning the shared database.
+
+    Async so that FastAPI calls it on the event loop instead of sending it to the threadpool.
+    """
+    return db
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+from fastapi import Depends
+
+from src.core.db import Database, get_db
+
+
+class NodeLoader:
+    """Batches node lookups by a unique property, DataLoader style.
+
+    All `load` calls made before the event loop gets to run the batch are answered by a single
+    `MATCH ... WHERE n.key IN $keys` query. Results are memoized for the lifetime of the loader,
+    which is one request (see `get_loaders`). Returned dicts are shared, do not modify them.
+    """
+
+    def __init__(self, db: Database, label: str, key: str = "id"):
+        self.db = db
+        self.label = label
+        self.key = key
+        self._results: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    def load(self, value: Hashable) -> "asyncio.Future[Optional[Dict[str, Any]]]":
+        """Properties of the node whose `key` is `value`, or None if there is no such node."""
+        future = self._results.get(value)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._results[value] = loop.create_future()
+            self._queue.append(value)
+            if len(self._queue) == 1:
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        return future
+
+    async def load_many(self, values: Iterable[Hashable]) -> List[Optional[Dict[str, Any]]]:
+        return list(await asyncio.gather(*(self.load(value) for value in values)))
+
+    def forget(self, value: Hashable) -> None:
+        """Drop the memoized result, e.g. after the node was updated. Pending loads are kept."""
+        future = self._results.get(value)
+        if future is not None and future.done():
+            del self._results[value]
+
+    async def _dispatch(self) -> None:
+        values, self._queue = self._queue, []
+        query = f"MATCH (node:{self.label}) WHERE node.{self.key} IN $values RETURN node"
+        try:
+            rows = await self.db.read(query, {"values": values}, name=f"loader.{self.label}.{self.key}")
+        except Exception as err:
+            for value in values:
+                future = self._results.pop(value)
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        nodes = {row["node"][self.key]: row["node"] for row in rows}
+        for value in values:
+            future = self._results[value]
+            if not future.done():
+                future.set_result(nodes.get(value))
+
+
+class Loaders:
+    """Node loaders of one request."""
+
+    def __init__(self, db: Database):
+        self.users = NodeLoader(db, "User")
+        self.restaurants = NodeLoader(db, "Restaurant")
+
+
+async def get_loaders(db: Database = Depends(get_db)) -> Loaders:
+    """FastAPI dependency, FastAPI caches it so every dependency of a request shares the loaders.
+
+    Async so that FastAPI calls it on the event loop instead of sending it to the threadpool.
+    """
+    return Loaders(db)
@@ -0,0 +1,139 @@
+"""Minimal Prometheus style metrics, rendered in the text exposition format by GET /metrics."""
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from src.core.cache import caches
+
+
+"""Latency buckets in seconds, from 1ms to 10s."""
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        metrics.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+
+    def format_labels(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self.values: Dict[Labels, float] = defaultdict(float)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{self.format_labels(key)} {value}" for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] -= amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        """Per labels: count of observations in each bucket (not cumulative, last one is +Inf), and their sum."""
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = defaultdict(float)
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self.format_labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self.format_labels(key)} {self.sums[key]}")
+            lines.append(f"{self.name}_count{self.format_labels(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+"""All the metrics, in the order they are rendered."""
+metrics: List[Metric] = []
+
+"""Functions returning extra lines computed at scrape time."""
+collectors: List[Callable[[], List[str]]] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collect in collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def collect_caches() -> List[str]:
+    lines = []
+    for stat, type_ in (("hits", "counter"), ("misses", "counter"), ("size", "gauge")):
+        name = f"cache_{stat}" + ("_total" if type_ == "counter" else "")
+        lines += [f"# HELP {name} Cache {stat}.", f"# TYPE {name} {type_}"]
+        for cache_name, cache in caches.items():
+            value = cache.stats().get(stat)
+            if value is not None:
+                lines.append(f'{name}{{cache="{_escape(cache_name)}"}} {value}')
+    return lines
+
+
+collectors.append(collect_caches)
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time to respond to HTTP requests.", ["method", "route", "status"]
+)
+auth_duration = Histogram("auth_duration_seconds", "Time to resolve the current user from the bearer token.")
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+neo4j_query_duration = Histogram(
+    "neo4j_query_duration_seconds", "Time to run a Neo4j query and fetch its result.", ["query"]
+)
+neo4j_query_errors = Counter("neo4j_query_errors_total", "Neo4j queries that raised.", ["query"])
+neo4j_result_available_after = Histogram(
+    "neo4j_result_available_after_seconds", "Server side time until the first record was available.", ["query"]
+)
+neo4j_query_updates = Counter(
+    "neo4j_query_updates_total", "Graph updates made by queries (nodes_created, properties_set...).",
+    ["query", "counter"]
+)
+neo4j_db_hits = Counter("neo4j_profiled_db_hits_total", "Database hits of the sampled PROFILE runs.", ["query"])
+neo4j_pool_wait = Histogram(
+    "neo4j_pool_wait_seconds", "Time waiting for a free session slot (connection pool size)."
+)
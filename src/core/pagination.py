@@ -0,0 +1,25 @@
+import json
+import base64
+import binascii
+from typing import Any, List
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque cursor pointing right after the row with these sort key values."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Return sort key values stored in the cursor, raise 400 if the cursor is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: '{cursor}'"
+        )
+    return values
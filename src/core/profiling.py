@@ -0,0 +1,119 @@
+"""Slow query log, result counters and sampled PROFILE plans of the named queries run through `Database`."""
+import logging
+import random
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from src.core.metrics import neo4j_db_hits, neo4j_query_updates, neo4j_result_available_after
+from src.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+"""Statements that cannot be prefixed with PROFILE."""
+NOT_PROFILABLE = re.compile(
+    r"\s*(EXPLAIN|PROFILE|SHOW|DROP|CREATE\s+(CONSTRAINT|INDEX|FULLTEXT|LOOKUP|BTREE))\b", re.IGNORECASE
+)
+
+"""Operators worth a look in a plan: they read every node (of a label) or multiply rows."""
+SCAN_OPERATORS = {"AllNodesScan", "NodeByLabelScan", "CartesianProduct"}
+
+UPDATE_COUNTERS = (
+    "nodes_created",
+    "nodes_deleted",
+    "relationships_created",
+    "relationships_deleted",
+    "properties_set",
+    "labels_added",
+    "labels_removed",
+)
+
+
+def should_profile(query: str) -> bool:
+    rate = settings.profile_sample_rate
+    return rate > 0 and random.random() < rate and not NOT_PROFILABLE.match(query)
+
+
+def redact(parameters: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Keep the names and shapes of the parameters, never their values (emails, password hashes...)."""
+    return {key: _shape(value) for key, value in (parameters or {}).items()}
+
+
+def _shape(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"<list[{len(value)}]>"
+    if isinstance(value, dict):
+        return f"<map[{len(value)}]>"
+    return f"<{type(value).__name__}>"
+
+
+def plan_operators(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten an EXPLAIN or PROFILE plan tree into its operators, root first."""
+    operators = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        operators.append({
+            "operator": node.get("operatorType", "").split("@")[0],
+            "db_hits": node.get("dbHits", 0),
+            "rows": node.get("rows", 0),
+            "estimated_rows": node.get("args", {}).get("EstimatedRows", 0),
+            "details": node.get("args", {}).get("Details"),
+        })
+        stack.extend(reversed(node.get("children", [])))
+    return operators
+
+
+class QueryProfiles:
+    """Last sampled plan of each named query, for GET /query-profiles."""
+
+    def __init__(self, maxsize: int = 200):
+        self.maxsize = maxsize
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def record(self, name: str, query: str, plan: Dict[str, Any], duration: float) -> None:
+        operators = plan_operators(plan)
+        db_hits = sum(operator["db_hits"] for operator in operators)
+        neo4j_db_hits.inc(name, amount=db_hits)
+        self._profiles.pop(name, None)
+        self._profiles[name] = {
+            "query": " ".join(query.split()),
+            "db_hits": db_hits,
+            "duration_ms": round(duration * 1000, 3),
+            "scans": sorted({op["operator"] for op in operators if op["operator"] in SCAN_OPERATORS}),
+            "operators": operators,
+        }
+        if len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Profiles sorted by db hits, heaviest first."""
+        return dict(sorted(self._profiles.items(), key=lambda item: item[1]["db_hits"], reverse=True))
+
+
+profiles = QueryProfiles()
+
+
+def record_summary(name: str, query: str, parameters: Optional[Dict[str, Any]], summary: Any, duration: float) -> None:
+    """Export the counters of a consumed result, keep its plan if it was profiled, log it if it was slow."""
+    counters = summary.counters
+    for counter in UPDATE_COUNTERS:
+        value = getattr(counters, counter)
+        if value:
+            neo4j_query_updates.inc(name, counter, amount=value)
+    if summary.result_available_after is not None:
+        neo4j_result_available_after.observe(summary.result_available_after / 1000, name)
+    if summary.profile:
+        profiles.record(name, query, summary.profile, duration)
+
+    if duration * 1000 >= settings.slow_query_ms:
+        logger.warning(
+            "Slow query %s: %.1fms (available after %sms, consumed after %sms) %s parameters=%s",
+            name,
+            duration * 1000,
+            summary.result_available_after,
+            summary.result_consumed_after,
+            " ".join(query.split()),
+            redact(parameters),
+        )
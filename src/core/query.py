@@ -0,0 +1,19 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+def set_properties(
+    alias: str,
+    attributes: BaseModel,
+    allowed: Optional[Iterable[str]] = None,
+    parameter: str = "props",
+) -> Tuple[str, Dict[str, Any]]:
+    """Build a parameterised `SET alias += $props` clause and its parameters.
+
+    Only fields of the model (or `allowed` ones) with a value are set, the values travel as
+    parameters, so the query text does not depend on them and Neo4j reuses its cached plan.
+    """
+    allowed = set(type(attributes).__fields__ if allowed is None else allowed)
+    props = {key: value for key, value in attributes.dict().items() if key in allowed and value}
+    return f"SET {alias} += ${parameter}", {parameter: props}
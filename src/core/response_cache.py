@@ -0,0 +1,108 @@
+import hashlib
+from urllib.parse import urlencode
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from src.settings import settings
+from src.core.bookmarks import current_bookmarks
+from src.core.cache import TTLCache, caches
+from src.core.responses import dumps
+
+
+class MemoryBackend:
+    """Per-process backend, an LRU with TTL."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.cache = TTLCache(name, maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.cache.set(key, value)
+
+    async def clear(self) -> None:
+        self.cache.clear()
+
+
+class RedisBackend:
+    """Backend shared by all the workers. Needs the `redis` package."""
+
+    def __init__(self, name: str, url: str, ttl: float):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+        self.prefix = f"responses:{name}:"
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.redis.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.redis.set(self.prefix + key, value, ex=int(self.ttl))
+
+    async def clear(self) -> None:
+        keys = [key async for key in self.redis.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.redis.delete(*keys)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ResponseCache:
+    """Serialized JSON responses by route and query parameters, answered with an ETag.
+
+    Clients sending a matching If-None-Match get 304 without a body.
+    Call `invalidate` after every write that may change the cached responses.
+    """
+
+    def __init__(self, name: str):
+        if settings.redis_url:
+            self.backend = RedisBackend(name, settings.redis_url, ttl=settings.response_cache_ttl)
+        else:
+            self.backend = MemoryBackend(
+                name, maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl
+            )
+
+    @staticmethod
+    def key(request: Request) -> str:
+        return f"{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+
+    async def respond(self, request: Request, build: Callable[[], Awaitable[Any]]) -> Response:
+        """Respond from the cache, or build JSON compatible content, cache and return it."""
+        key = self.key(request)
+        bookmarks = current_bookmarks.get()
+        """A client that waits for its own writes must not get a response cached before them."""
+        body = None if bookmarks and bookmarks.received else await self.backend.get(key)
+        if body is None:
+            body = dumps(await build())
+            await self.backend.set(key, body)
+
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if etag in _parse_if_none_match(request.headers.get("if-none-match")):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+    async def invalidate(self) -> None:
+        await self.backend.clear()
+
+
+def _parse_if_none_match(header: Optional[str]) -> Tuple[str, ...]:
+    if not header:
+        return ()
+    return tuple(tag.strip().replace("W/", "", 1) for tag in header.split(","))
@@ -0,0 +1,28 @@
+"""Fast JSON encoding: orjson when it is installed, the standard library otherwise."""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encode JSON compatible content (datetimes and UUIDs are fine with orjson only)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=str)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with `dumps`.
+
+    Returning it from a route skips `response_model` validation, so only use it for content
+    that is already in its final shape (see `trusted_restaurant`).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
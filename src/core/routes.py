@@ -1,10 +1,58 @@
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src.core import metrics, schema
+from src.core.cache import caches
+from src.core.db import Database, get_db
+from src.core.profiling import profiles
+from src.settings import settings
 
 
 router = APIRouter()
 
+"""Routes mounted without authentication, for scrapers and probes."""
+public_router = APIRouter()
+
 
 @router.get("/healthcheck")
 def health_check():
     return {"status": "Ok"}
+
+
+@router.get("/cache-stats")
+def cache_stats():
+    """Size, hits, misses and hit ratio of every cache."""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+@router.get("/query-profiles")
+def query_profiles():
+    """Last sampled PROFILE of each named query with its db hits and label/full scans, heaviest first."""
+    return profiles.stats()
+
+
+@public_router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Request, query and cache metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@public_router.get("/healthz")
+def liveness():
+    """The process is up and serving, without looking at Neo4j."""
+    return {"status": "Ok"}
+
+
+@public_router.get("/readyz")
+async def readiness(db: Database = Depends(get_db)):
+    """Neo4j answers and the schema was applied, 503 otherwise."""
+    checks = {
+        "database": await db.ping(settings.readiness_timeout_seconds),
+        "schema": schema.applied,
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        {"status": "Ok" if ready else "Unavailable", **checks},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
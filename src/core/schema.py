@@ -0,0 +1,81 @@
+"""Constraints and indexes the application relies on.
+
+Applied on startup, every statement is idempotent. Can also be run by hand:
+
+    python -m src.core.schema apply
+    python -m src.core.schema verify
+"""
+import sys
+import asyncio
+import argparse
+from typing import List
+
+from src.core.db import Database, db
+
+
+"""(name, statement) pairs, names are the ones reported by SHOW CONSTRAINTS / SHOW INDEXES."""
+SCHEMA = [
+    ("user_id_unique",
+     "CREATE CONSTRAINT user_id_unique IF NOT EXISTS ON (user:User) ASSERT user.id IS UNIQUE"),
+    ("user_email_unique",
+     "CREATE CONSTRAINT user_email_unique IF NOT EXISTS ON (user:User) ASSERT user.email IS UNIQUE"),
+    ("restaurant_id_unique",
+     "CREATE CONSTRAINT restaurant_id_unique IF NOT EXISTS ON (res:Restaurant) ASSERT res.id IS UNIQUE"),
+    ("restaurant_name_unique",
+     "CREATE CONSTRAINT restaurant_name_unique IF NOT EXISTS ON (res:Restaurant) ASSERT res.name IS UNIQUE"),
+    ("restaurant_active",
+     "CREATE INDEX restaurant_active IF NOT EXISTS FOR (res:Restaurant) ON (res.active)"),
+    ("restaurant_cuisine",
+     "CREATE INDEX restaurant_cuisine IF NOT EXISTS FOR (res:Restaurant) ON (res.cuisine)"),
+    ("restaurant_created_at",
+     "CREATE INDEX restaurant_created_at IF NOT EXISTS FOR (res:Restaurant) ON (res.created_at)"),
+    ("restaurant_geo",
+     "CREATE INDEX restaurant_geo IF NOT EXISTS FOR (res:Restaurant) ON (res.geo)"),
+    ("restaurant_search",
+     "CREATE FULLTEXT INDEX restaurant_search IF NOT EXISTS "
+     "FOR (res:Restaurant) ON EACH [res.name, res.about, res.cuisine]"),
+]
+
+
+"""Set once `apply_schema` succeeded, reported by GET /readyz."""
+applied = False
+
+
+async def apply_schema(db: Database) -> None:
+    """Create all the missing constraints and indexes."""
+    global applied
+    for _, statement in SCHEMA:
+        await db.run(statement, name="schema.apply")
+    applied = True
+
+
+async def missing_schema(db: Database) -> List[str]:
+    """Return names of the constraints and indexes that are not in the database."""
+    constraints = await db.run("SHOW CONSTRAINTS", name="schema.show_constraints")
+    indexes = await db.run("SHOW INDEXES", name="schema.show_indexes")
+    existing = {row["name"] for row in constraints + indexes}
+    return [name for name, _ in SCHEMA if name not in existing]
+
+
+async def main(command: str) -> int:
+    await db.connect()
+    try:
+        if command == "apply":
+            await apply_schema(db)
+        missing = await missing_schema(db)
+    finally:
+        await db.close()
+
+    for name in missing:
+        print(f"Missing: {name}")
+    if missing:
+        return 1
+    print("Schema is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or verify Neo4j constraints and indexes.")
+    parser.add_argument("command", choices=["apply", "verify"])
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.command)))
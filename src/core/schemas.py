@@ -1,10 +1,15 @@
 from pydantic import BaseModel
+from pydantic.generics import GenericModel
 from uuid import UUID
-from typing import Union
+from typing import Generic, List, Optional, TypeVar, Union
+
+
+T = TypeVar("T")
 
 
 class Query(BaseModel):
     response: list
+    truncated: bool = False
 
 
 class GUID(BaseModel):
@@ -13,3 +18,8 @@ class GUID(BaseModel):
 
 class Message(BaseModel):
     message: str
+
+
+class Page(GenericModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,43 @@
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+
+"""Lines are sent in chunks of about this many bytes."""
+CHUNK_SIZE = 64 * 1024
+
+
+async def ndjson_chunks(records: AsyncIterator[Dict[str, Any]], compress: bool = False) -> AsyncIterator[bytes]:
+    """Serialize records one JSON document per line, optionally gzipped, keeping only one chunk in memory."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    buffer, buffered = [], 0
+    async for record in records:
+        line = json.dumps(record, default=str).encode() + b"\n"
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= CHUNK_SIZE:
+            chunk = b"".join(buffer)
+            buffer, buffered = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def ndjson_response(records: AsyncIterator[Dict[str, Any]], filename: str, compress: bool = False) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        ndjson_chunks(records, compress),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+
+logger = logging.getLogger(__name__)
+
+"""Background tasks started by the application, cancelled on shutdown."""
+tasks: List[asyncio.Task] = []
+
+
+def run_periodically(interval: float, func: Callable[[], Awaitable[None]]) -> asyncio.Task:
+    """Call `func` right away and then every `interval` seconds, until cancelled. Errors are logged."""
+    async def loop():
+        while True:
+            try:
+                await func()
+            except Exception:
+                logger.exception("Periodic task %s failed", getattr(func, "__qualname__", func))
+            await asyncio.sleep(interval)
+
+    task = asyncio.create_task(loop())
+    tasks.append(task)
+    return task
+
+
+async def cancel_all() -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    tasks.clear()
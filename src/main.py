@@ -1,14 +1,28 @@
 import time
+from functools import partial
 
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request, Depends, status
 from fastapi.middleware import Middleware
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+from starlette.routing import Match
 
-from src.core.routes import router as core_router
+from src.core.bookmarks import BOOKMARK_HEADER, BookmarkError, BookmarkMiddleware
+from src.core.db import db
+from src.core.schema import apply_schema
+from src.core.tasks import cancel_all, run_periodically
+from src.settings import settings
+from src.core.metrics import http_request_duration, http_requests_in_flight
+from src.core.cypher import router as cypher_router
+from src.core.routes import public_router as core_public_router, router as core_router
 from src.auth.routes import router as auth_router
 from src.users.routes import router as user_router
-from src.auth.services import get_current_active_user
+from src.auth.services import get_current_active_user, get_current_admin_user, password_executor
 from src.restaurants.routes import router as restaurant_router
+from src.restaurants.recommendations import similarity_executor, similarity_index
+from src.restaurants.leaderboard import reconcile_likes
+from src.restaurants.migrations import migrate
 
 
 middleware = [
@@ -17,8 +31,10 @@ middleware = [
         allow_origins=["*"],
         allow_credentials=True,
         allow_methods=["*"],
-        allow_headers=["*"]
-    )
+        allow_headers=["*"],
+        expose_headers=[BOOKMARK_HEADER]
+    ),
+    Middleware(BookmarkMiddleware)
 ]
 
 app = FastAPI(
@@ -31,12 +47,23 @@ app = FastAPI(
     debug=True,
 )
 
+app.include_router(
+    core_public_router,
+    tags=["Core"]
+)
+
 app.include_router(
     core_router,
     tags=["Core"],
     dependencies=[Depends(get_current_active_user)]
 )
 
+app.include_router(
+    cypher_router,
+    tags=["Core"],
+    dependencies=[Depends(get_current_admin_user)]
+)
+
 app.include_router(
     auth_router,
     tags=["Auth"],
@@ -57,16 +84,66 @@ app.include_router(
 )
 
 
+async def database_unavailable(request: Request, exc: Exception):
+    """Transient Neo4j errors that outlived the retries (or happened in writes, which are not retried)."""
+    return JSONResponse(
+        {"detail": "Database is temporarily unavailable, retry later."},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+for error in (ServiceUnavailable, SessionExpired, TransientError):
+    app.add_exception_handler(error, database_unavailable)
+
+
+@app.exception_handler(BookmarkError)
+async def invalid_bookmark(request: Request, exc: BookmarkError):
+    """Bookmarks come from the client, a bad one is a bad request and retrying it will not help."""
+    return JSONResponse(
+        {"detail": f"Invalid {BOOKMARK_HEADER}: {exc}"},
+        status_code=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def route_template(request: Request) -> str:
+    """Label by route template (/restaurants/{restaurant_id}), not by path, to keep the number of series bounded."""
+    for route in app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    start_time = time.perf_counter()
+    http_requests_in_flight.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        http_requests_in_flight.dec()
+        process_time = time.perf_counter() - start_time
+        http_request_duration.observe(process_time, request.method, route_template(request), str(status_code))
     response.headers["X-Process-Time"] = str(process_time)
     return response
 
 
 @app.on_event("startup")
 async def startup() -> None:
-    print("Waiting for Neo4j...")
-    time.sleep(10)
+    await db.connect()
+    await db.warm_up(settings.neo4j_pool_warmup)
+    await apply_schema(db)
+    await migrate(db)
+    run_periodically(settings.recommendations_refresh_seconds, partial(similarity_index.refresh, db))
+    run_periodically(settings.likes_reconcile_seconds, partial(reconcile_likes, db))
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    await cancel_all()
+    await db.close()
+    password_executor.shutdown(wait=False)
+    similarity_executor.shutdown(wait=False)
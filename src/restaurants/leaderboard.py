@@ -0,0 +1,132 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from src.settings import settings
+from src.core.db import Database
+
+
+"""Board with all the restaurants, every cuisine also has its own board."""
+ALL = "all"
+
+
+class LocalLeaderboard:
+    """Sorted like counts kept in process, mirrors the Redis sorted set commands used.
+
+    Reads are O(limit), updates are O(n) in the worst case because of the list insert,
+    which is fine for the number of restaurants we have.
+    """
+
+    def __init__(self):
+        self._scores: Dict[str, Dict[str, int]] = {}
+        self._sorted: Dict[str, List[Tuple[int, str]]] = {}
+
+    async def set(self, board: str, member: str, score: int) -> None:
+        await self.remove(board, member)
+        if score > 0:
+            self._scores.setdefault(board, {})[member] = score
+            insort(self._sorted.setdefault(board, []), (-score, member))
+
+    async def remove(self, board: str, member: str) -> None:
+        score = self._scores.get(board, {}).pop(member, None)
+        if score is not None:
+            entries = self._sorted[board]
+            del entries[bisect_left(entries, (-score, member))]
+
+    async def top(self, board: str, limit: int) -> List[Tuple[str, int]]:
+        return [(member, -score) for score, member in self._sorted.get(board, [])[:limit]]
+
+    async def replace(self, boards: Dict[str, Dict[str, int]]) -> None:
+        """Drop all the boards and load these ones instead."""
+        self._scores = {board: dict(scores) for board, scores in boards.items()}
+        self._sorted = {
+            board: sorted((-score, member) for member, score in scores.items())
+            for board, scores in boards.items()
+        }
+
+
+class RedisLeaderboard:
+    """Leaderboard in Redis sorted sets, shared by all the workers. Needs the `redis` package."""
+
+    def __init__(self, url: str, prefix: str = "leaderboard:"):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url)
+        self.prefix = prefix
+
+    async def set(self, board: str, member: str, score: int) -> None:
+        if score > 0:
+            await self.redis.zadd(self.prefix + board, {member: score})
+        else:
+            await self.remove(board, member)
+
+    async def remove(self, board: str, member: str) -> None:
+        await self.redis.zrem(self.prefix + board, member)
+
+    async def top(self, board: str, limit: int) -> List[Tuple[str, int]]:
+        entries = await self.redis.zrevrange(self.prefix + board, 0, limit - 1, withscores=True)
+        return [(member.decode(), int(score)) for member, score in entries]
+
+    async def replace(self, boards: Dict[str, Dict[str, int]]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            async for key in self.redis.scan_iter(match=self.prefix + "*"):
+                pipeline.delete(key)
+            for board, scores in boards.items():
+                if scores:
+                    pipeline.zadd(self.prefix + board, scores)
+            await pipeline.execute()
+
+
+leaderboard = RedisLeaderboard(settings.redis_url) if settings.redis_url else LocalLeaderboard()
+
+
+def cuisine_board(cuisine: Optional[str]) -> str:
+    return f"cuisine:{cuisine}" if cuisine else ALL
+
+
+async def record_likes(restaurant_id: str, likes: int, cuisine: Optional[str]) -> None:
+    """Update restaurant's like count on the leaderboards after a like or an unlike."""
+    await leaderboard.set(ALL, restaurant_id, likes)
+    if cuisine:
+        await leaderboard.set(cuisine_board(cuisine), restaurant_id, likes)
+
+
+async def forget_restaurant(restaurant_id: str, cuisine: Optional[str]) -> None:
+    await leaderboard.remove(ALL, restaurant_id)
+    if cuisine:
+        await leaderboard.remove(cuisine_board(cuisine), restaurant_id)
+
+
+async def move_restaurant(
+    restaurant_id: str,
+    likes: int,
+    previous_cuisine: Optional[str],
+    cuisine: Optional[str],
+) -> None:
+    """Move the restaurant's entry from the board of its previous cuisine to the board of its new one."""
+    if previous_cuisine:
+        await leaderboard.remove(cuisine_board(previous_cuisine), restaurant_id)
+    if cuisine and likes > 0:
+        await leaderboard.set(cuisine_board(cuisine), restaurant_id, likes)
+
+
+async def reconcile_likes(db: Database) -> None:
+    """Recount likes of every restaurant from LIKES edges, fix drifted counters and reload the leaderboards."""
+    query_recount = """
+        MATCH (res:Restaurant)
+        OPTIONAL MATCH (:User)-[like:LIKES]->(res)
+        WITH res, count(like) AS likes
+        WHERE res.likes IS NULL OR res.likes <> likes
+        SET res.likes = likes
+    """
+    await db.run(query_recount, name="leaderboard.recount_likes")
+
+    query_likes = """
+        MATCH (res:Restaurant) WHERE res.likes > 0 AND coalesce(res.active, true)
+        RETURN res.id AS id, res.likes AS likes, res.cuisine AS cuisine
+    """
+    boards: Dict[str, Dict[str, int]] = {ALL: {}}
+    async for row in db.stream(query_likes, name="leaderboard.load_likes"):
+        boards[ALL][row["id"]] = row["likes"]
+        if row["cuisine"]:
+            boards.setdefault(cuisine_board(row["cuisine"]), {})[row["id"]] = row["likes"]
+    await leaderboard.replace(boards)
@@ -0,0 +1,61 @@
+"""Data migrations of Restaurant nodes. Run on startup, every migration is idempotent.
+
+    python -m src.restaurants.migrations
+"""
+import asyncio
+from typing import Tuple
+
+from src.core.db import Database, db
+from src.restaurants.schemas import GeoPoint, parse_geo
+
+
+async def migrate_geo_strings(db: Database) -> Tuple[int, int]:
+    """Turn "latitude,longitude" strings in Restaurant.geo into points.
+
+    Values that cannot be parsed are moved to `geo_legacy`. Returns (migrated, moved) counts.
+    """
+    """STARTS WITH is only true for strings, points already migrated are skipped."""
+    query_strings = "MATCH (res:Restaurant) WHERE res.geo STARTS WITH '' RETURN res.id AS id, res.geo AS geo"
+    points, legacy = [], []
+    for row in await db.read(query_strings, name="migrations.geo_strings"):
+        try:
+            geo = GeoPoint.parse_obj(parse_geo(row["geo"]))
+        except ValueError:
+            legacy.append(row["id"])
+            continue
+        points.append({"id": row["id"], "latitude": geo.latitude, "longitude": geo.longitude})
+
+    query_points = """
+        UNWIND $rows AS row
+        MATCH (res:Restaurant) WHERE res.id = row.id
+        SET res.geo = point({latitude: row.latitude, longitude: row.longitude})
+    """
+    query_legacy = """
+        UNWIND $ids AS id
+        MATCH (res:Restaurant) WHERE res.id = id
+        SET res.geo_legacy = res.geo
+        REMOVE res.geo
+    """
+    if points:
+        await db.run(query_points, {"rows": points}, name="migrations.geo_points")
+    if legacy:
+        await db.run(query_legacy, {"ids": legacy}, name="migrations.geo_legacy")
+    return len(points), len(legacy)
+
+
+async def migrate(db: Database) -> None:
+    migrated, moved = await migrate_geo_strings(db)
+    if migrated or moved:
+        print(f"Restaurant.geo: {migrated} strings converted to points, {moved} unparsable moved to geo_legacy")
+
+
+async def main() -> None:
+    await db.connect()
+    try:
+        await migrate(db)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
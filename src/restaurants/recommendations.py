@@ -0,0 +1,101 @@
+import heapq
+import asyncio
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import combinations
+from math import sqrt
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.settings import settings
+from src.core.db import Database
+from src.core.loader import Loaders
+
+
+"""Likes of very active users are truncated to this many, to bound the pairs counted per user."""
+MAX_LIKES_PER_USER = 200
+
+"""Counting co-likes is pure Python, in a thread it would still hold the GIL and stall the event loop.
+The worker process is started on the first refresh."""
+similarity_executor = ProcessPoolExecutor(max_workers=1)
+
+
+class SimilarityIndex:
+    """Most similar restaurants for every restaurant, computed from co-likes.
+
+    Similarity of two restaurants is the cosine of their likers sets:
+    co_likes / sqrt(likes_a * likes_b). Only `top_k` neighbours are kept per restaurant,
+    so recommending is a few dictionary lookups instead of a graph traversal.
+    """
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.neighbours: Dict[str, List[Tuple[str, float]]] = {}
+        self.refreshed_at: Optional[datetime] = None
+
+    @staticmethod
+    def compute(likes_by_user: Iterable[List[str]], top_k: int) -> Dict[str, List[Tuple[str, float]]]:
+        co_likes: Dict[str, Counter] = defaultdict(Counter)
+        likes: Counter = Counter()
+        for liked in likes_by_user:
+            liked = sorted(set(liked[-MAX_LIKES_PER_USER:]))
+            likes.update(liked)
+            for first, second in combinations(liked, 2):
+                co_likes[first][second] += 1
+                co_likes[second][first] += 1
+
+        neighbours = {}
+        for restaurant_id, counter in co_likes.items():
+            scored = (
+                (other_id, count / sqrt(likes[restaurant_id] * likes[other_id]))
+                for other_id, count in counter.items()
+            )
+            neighbours[restaurant_id] = heapq.nlargest(top_k, scored, key=itemgetter(1))
+        return neighbours
+
+    def recommend(self, liked: Iterable[str], limit: int) -> List[Tuple[str, float]]:
+        """Restaurants most similar to the liked ones, best first, without the liked ones."""
+        liked = set(liked)
+        scores: Dict[str, float] = defaultdict(float)
+        for restaurant_id in liked:
+            for other_id, score in self.neighbours.get(restaurant_id, ()):
+                if other_id not in liked:
+                    scores[other_id] += score
+        return heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+
+    async def refresh(self, db: Database) -> None:
+        """Reload LIKES edges and recompute neighbours in the worker process."""
+        query = """
+            MATCH (u:User)-[:LIKES]->(res:Restaurant)
+            RETURN u.id AS user_id, collect(res.id) AS liked
+        """
+        likes_by_user = [record["liked"] async for record in db.stream(query, name="recommendations.load_likes")]
+        loop = asyncio.get_running_loop()
+        self.neighbours = await loop.run_in_executor(similarity_executor, self.compute, likes_by_user, self.top_k)
+        self.refreshed_at = datetime.utcnow()
+
+
+similarity_index = SimilarityIndex(top_k=settings.recommendations_top_k)
+
+
+async def recommend_restaurants(db: Database, loaders: Loaders, user_id: str, limit: int) -> List[Dict]:
+    """Top `limit` active restaurants for the user, as RestaurantShortInfo fields plus `score`."""
+    query_liked = """
+        MATCH (u:User)-[:LIKES]->(res:Restaurant) WHERE u.id = $user_id
+        RETURN res.id AS id
+    """
+    liked = [row["id"] for row in await db.read(query_liked, {"user_id": user_id}, name="recommendations.user_likes")]
+    """Ask for a few more, some of the recommended restaurants may be inactive by now."""
+    scores = dict(similarity_index.recommend(liked, limit * 2))
+    if not scores:
+        return []
+
+    restaurants = [
+        {"id": restaurant["id"], "name": restaurant["name"], "image": restaurant.get("image"),
+         "score": scores[restaurant["id"]]}
+        for restaurant in await loaders.restaurants.load_many(scores)
+        if restaurant is not None and restaurant.get("active", True) is not False
+    ]
+    restaurants.sort(key=itemgetter("score"), reverse=True)
+    return restaurants[:limit]
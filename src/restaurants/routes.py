@@ -1,77 +1,227 @@
 import os
-import uuid
 import shutil
 from datetime import datetime
 
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Response, HTTPException, status
+from fastapi import APIRouter, Depends, Query, Request, Response, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from neo4j.exceptions import ConstraintError
 
-from src.core.db import neo4j_driver
-from src.core.schemas import GUID, Message
-from src.restaurants.schemas import Restaurant, RestaurantCreate, RestaurantUpdate
-from src.restaurants.services import restaurant_with_this_name_exists
+from src.settings import settings
+from src.auth.services import get_current_active_user, get_current_admin_user
+from src.core.db import Database, get_db
+from src.core.loader import Loaders, get_loaders
+from src.core.query import set_properties
+from src.core.response_cache import ResponseCache
+from src.core.responses import FastJSONResponse
+from src.core.schemas import GUID, Message, Page
+from src.users.schemas import User
+from src.core.streaming import ndjson_response
+from src.restaurants.schemas import (
+    BulkImportResult, LikeOperation, LikeResult, NearbyRestaurant, Restaurant, RestaurantCreate, RestaurantPartial,
+    RestaurantSearchResult, RestaurantUpdate,
+)
+from src.restaurants.services import (
+    RESTAURANT_FIELDS, apply_likes, bulk_create_restaurants, jsonable_properties, likes_after_unlike, list_restaurants,
+    ndjson_rows, nearby_restaurants, neo4j_properties, new_restaurant_attributes, parse_fields, restaurant_likers,
+    search_restaurants, top_restaurants, trusted_restaurant,
+)
+from src.restaurants.leaderboard import forget_restaurant, move_restaurant, record_likes
 
 
 router = APIRouter()
 
+"""GET /restaurants and GET /restaurants/{id} responses, dropped on every restaurant write."""
+response_cache = ResponseCache("restaurant-responses")
 
-@router.get("/", response_model=List[Restaurant])
-async def get_list(name: Optional[str] = ""):
-    """If name specified, uses searches restaurants by that exact name.<br/>
-       If not, returns all the restaurants.
+
+@router.get("/", response_model=Page[RestaurantPartial], response_model_exclude_unset=True)
+async def get_list(
+    request: Request,
+    name: Optional[str] = "",
+    active: Optional[bool] = None,
+    cuisine: Optional[str] = None,
+    limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Returns restaurants page by page, ordered by creation time.<br/>
+       If name, active or cuisine specified, returns only restaurants with exactly these values.<br/>
+       Pass `next_cursor` of the previous page as `cursor` to get the next one.<br/>
+       `fields` is a comma separated list of fields to return, or "short" for id, name and image.<br/>
+       Responses are cached and carry an ETag, send it in If-None-Match to get 304 if nothing changed.
     """
-    if name:
-        query = """
-           MATCH (res:Restaurant) WHERE res.name=$name
-           RETURN res
-        """
-        with neo4j_driver.session() as session:
-            restaurant_in_db = session.run(query=query, name=name)
-            restaurant_data = restaurant_in_db.data()
-    else:
-        query = "MATCH (res:Restaurant) RETURN res"
-        with neo4j_driver.session() as session:
-            restaurant_in_db = session.run(query=query)
-            restaurant_data = restaurant_in_db.data()
+    async def build():
+        filters = {"name": name or None, "active": active, "cuisine": cuisine}
+        selected = parse_fields(fields)
+        items, next_cursor = await list_restaurants(db, filters, selected, limit, cursor)
+        if settings.trusted_responses:
+            return {"items": [trusted_restaurant(item, selected) for item in items], "next_cursor": next_cursor}
+        page = Page[RestaurantPartial](items=items, next_cursor=next_cursor)
+        return jsonable_encoder(page, exclude_unset=True)
+
+    return await response_cache.respond(request, build)
+
+
+@router.get("/export", dependencies=[Depends(get_current_admin_user)])
+async def export_restaurants(gzip: bool = False, db: Database = Depends(get_db)):
+    """Stream all the restaurants as NDJSON, one restaurant per line. Admins only."""
+    projection = ", ".join(f".{field}" for field in RESTAURANT_FIELDS)
+    query = f"MATCH (res:Restaurant) RETURN res {{{projection}}} AS res"
+    restaurants = (jsonable_properties(record["res"]) async for record in db.stream(query, name="restaurants.export"))
+    return ndjson_response(restaurants, filename="restaurants", compress=gzip)
+
 
-    restaurants = [Restaurant(**restaurant["res"]) for restaurant in restaurant_data]
-    return restaurants
+@router.get("/top", response_model=List[Restaurant])
+async def get_top(
+    cuisine: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=settings.max_page_size),
+    loaders: Loaders = Depends(get_loaders)
+):
+    """Most liked restaurants, of the given cuisine if specified, most liked first."""
+    restaurants = await top_restaurants(loaders, cuisine, limit)
+    if settings.trusted_responses:
+        return FastJSONResponse([trusted_restaurant(restaurant) for restaurant in restaurants])
+    return [Restaurant(**restaurant) for restaurant in restaurants]
+
+
+@router.get("/nearby", response_model=Page[NearbyRestaurant])
+async def get_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(1000, gt=0, le=settings.max_nearby_radius, description="Meters"),
+    limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Active restaurants within `radius` meters from (lat, lon), closest first.<br/>
+       Pass `next_cursor` of the previous page as `cursor` to get the next one.
+    """
+    items, next_cursor = await nearby_restaurants(db, lat, lon, radius, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/search", response_model=Page[RestaurantSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    fuzzy: bool = True,
+    limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Full-text search of active restaurants by name, about and cuisine, most relevant first.<br/>
+       Words match as prefixes, and with `fuzzy` also with a typo or two.<br/>
+       Pass `next_cursor` of the previous page as `cursor` to get the next one.
+    """
+    items, next_cursor = await search_restaurants(db, q, fuzzy, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.post("/", response_model=GUID)
-async def create_restaurant(new_restaurant: RestaurantCreate):
+async def create_restaurant(new_restaurant: RestaurantCreate, db: Database = Depends(get_db)):
     restaurant_name = new_restaurant.name
-    if restaurant_with_this_name_exists(restaurant_name):
+    attributes = new_restaurant_attributes(new_restaurant)
+    cypher_create = "CREATE (res:Restaurant $params) RETURN res"
+
+    try:
+        response = await db.run(cypher_create, {"params": attributes}, name="restaurants.create")
+    except ConstraintError:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=f"Restaurant with name \"{restaurant_name}\" already exists.")
+    try:
+        restaurant_data = response[0]["res"]
+    except Exception as err:
+        print(f"Err: {err}")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Error: '{err}'",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    restaurant = Restaurant(**restaurant_data)
+    await response_cache.invalidate()
+    return {"id": restaurant.id}
 
-    attributes = {
-        "id": str(uuid.uuid4()),
-        "created_at": str(datetime.utcnow()),
-        "active": True
-    }
-    attributes.update(dict(new_restaurant))
-    cypher_create = "CREATE (res:Restaurant $params) RETURN res"
 
-    with neo4j_driver.session() as session:
-        response = session.run(query=cypher_create, parameters={"params": attributes})
+@router.post("/bulk", response_model=BulkImportResult, dependencies=[Depends(get_current_admin_user)])
+async def bulk_create(
+    request: Request,
+    batch_size: int = Query(settings.bulk_batch_size, ge=1, le=settings.max_bulk_batch_size),
+    db: Database = Depends(get_db)
+):
+    """Create many restaurants at once. Admins only.<br/>
+       Accepts a JSON array (application/json), NDJSON (application/x-ndjson)
+       or an NDJSON file uploaded as `file` (multipart/form-data).<br/>
+       Rows are written in batches of `batch_size`, one transaction per batch.
+       Invalid rows and rows with taken names are skipped and reported in `errors`.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
         try:
-            restaurant_data = response.data()[0]["res"]
-        except Exception as err:
-            print(f"Err: {err}")
+            documents = await request.json()
+        except ValueError as err:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Error: '{err}'",
-                headers={"WWW-Authenticate": "Bearer"}
+                detail=f"Invalid JSON: {err}"
             )
-    restaurant = Restaurant(**restaurant_data)
-    return {"id": restaurant.id}
+        if not isinstance(documents, list):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Expected a JSON array of restaurants."
+            )
+        rows = _enumerate(documents)
+    elif content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Expected an NDJSON file in the `file` field."
+            )
+        rows = ndjson_rows(_read_upload(upload))
+    else:
+        rows = ndjson_rows(request.stream())
+
+    result = await bulk_create_restaurants(db, rows, batch_size)
+    await response_cache.invalidate()
+    return result
+
+
+async def _enumerate(documents):
+    for row, document in enumerate(documents):
+        yield row, document
+
+
+async def _read_upload(upload, chunk_size: int = 64 * 1024):
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+
+@router.post("/likes", response_model=List[LikeResult])
+async def batch_like(
+    operations: List[LikeOperation],
+    current_user: User = Depends(get_current_active_user),
+    db: Database = Depends(get_db)
+):
+    """Like (add==True) or unlike (add==False) many restaurants for the current user in one transaction.<br/>
+       Operations are idempotent. If the same restaurant appears several times, the last operation wins
+       and every occurrence gets its result.
+    """
+    if len(operations) > settings.max_like_batch_size:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.max_like_batch_size} operations per request."
+        )
+    results = await apply_likes(db, current_user.id, operations)
+    """Cached restaurant responses carry the like counts."""
+    await response_cache.invalidate()
+    return results
 
 
 @router.post("/{restaurant_id}/like", response_model=Message)
-async def add_like(restaurant_id: str, user_id: str, add: bool):
-    """If add==True, create LIKES relation between user and restaurant.<br/>
+async def add_like(restaurant_id: str, user_id: str, add: bool, db: Database = Depends(get_db)):
+    """If add==True, create LIKES relation between user and restaurant, if it does not exist yet.<br/>
        If add==False, delete existing LIKES relation.<br/>
        If there is no existing LIKES relation, return 404 status code.
     """
@@ -79,58 +229,88 @@ async def add_like(restaurant_id: str, user_id: str, add: bool):
         query = """
             MATCH (u:User) WHERE u.id=$user_id
             MATCH (res:Restaurant) WHERE res.id=$restaurant_id
-            CREATE (u)-[r:LIKES]->(res)
-            RETURN r
+            MERGE (u)-[r:LIKES]->(res)
+            ON CREATE SET res.likes = coalesce(res.likes, 0) + 1, r.liked_at = $liked_at
+            RETURN r, coalesce(res.likes, 0) AS likes, res.cuisine AS cuisine, coalesce(res.active, true) AS active
         """
+        name = "restaurants.like"
     else:
-        query = """
-            MATCH (u)-[r:LIKES]->(res)
+        query = f"""
+            MATCH (u:User)-[r:LIKES]->(res:Restaurant)
             WHERE u.id=$user_id AND res.id=$restaurant_id
             DELETE r
-            RETURN u
+            SET res.likes = {likes_after_unlike("1")}
+            RETURN u, coalesce(res.likes, 0) AS likes, res.cuisine AS cuisine, coalesce(res.active, true) AS active
         """
-    with neo4j_driver.session() as session:
-        response = session.run(query=query, user_id=user_id, restaurant_id=restaurant_id)
-        restaurant_data = response.data()
+        name = "restaurants.unlike"
+    parameters = {"user_id": user_id, "restaurant_id": restaurant_id, "liked_at": str(datetime.utcnow())}
+    restaurant_data = await db.run(query, parameters, name=name)
     if not restaurant_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Request data not found"
         )
+    """Duplicate LIKES edges are all deleted and decrement the counter, one row each."""
+    likes = min(row["likes"] for row in restaurant_data)
+    """Inactive (deleted) restaurants stay off the leaderboards."""
+    if restaurant_data[0]["active"]:
+        await record_likes(restaurant_id, likes, restaurant_data[0]["cuisine"])
+    await response_cache.invalidate()
 
     return {"message": "Updated"}
 
 
+@router.get(
+    "/{restaurant_id}/likers",
+    response_model=Page[GUID],
+    dependencies=[Depends(get_current_active_user)]
+)
+async def get_likers(
+    restaurant_id: str,
+    limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Ids of users who liked the restaurant, latest likes first.<br/>
+       Pass `next_cursor` of the previous page as `cursor` to get the next one.
+    """
+    items, next_cursor = await restaurant_likers(db, restaurant_id, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+
 @router.get("/{restaurant_id}", response_model=Restaurant)
-async def get_one(restaurant_id):
-    query = "MATCH (res:Restaurant) WHERE res.id = $restaurant_id RETURN res"
+async def get_one(restaurant_id, request: Request, loaders: Loaders = Depends(get_loaders)):
+    """Responses are cached and carry an ETag, send it in If-None-Match to get 304 if nothing changed."""
+    async def build():
+        restaurant_data = await loaders.restaurants.load(restaurant_id)
 
-    with neo4j_driver.session() as session:
-        restaurant_in_db = session.run(query=query, parameters={"restaurant_id": restaurant_id})
-        restaurant_data = restaurant_in_db.data()
+        if restaurant_data is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request data not found"
+            )
+        return jsonable_encoder(Restaurant(**restaurant_data))
 
-    if not restaurant_data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Request data not found"
-        )
-    return Restaurant(**restaurant_data[0]["res"])
+    return await response_cache.respond(request, build)
 
 
 @router.patch("/{restaurant_id}", response_model=Restaurant)
-async def update_restaurant(restaurant_id, new_attrs: RestaurantUpdate):
+async def update_restaurant(restaurant_id, new_attrs: RestaurantUpdate, db: Database = Depends(get_db)):
     """Execute Cypher query to update Restaurant attributes"""
-    attributes_string = ", ".join(f"res.{key}=\"{value}\"" for (key, value) in dict(new_attrs).items() if value)
-    unpacked_attributes = "SET " + attributes_string
-    if unpacked_attributes == "SET ":
-        unpacked_attributes = ""
-
+    set_clause, parameters = set_properties("res", new_attrs)
+    parameters["props"] = neo4j_properties(parameters["props"])
     cypher_update = ("MATCH (res: Restaurant) WHERE res.id = $restaurant_id\n"
-                     f"{unpacked_attributes}\n"
-                     "RETURN res")
-    with neo4j_driver.session() as session:
-        updated_restaurant = session.run(query=cypher_update, parameters={"restaurant_id": restaurant_id})
-        restaurant_data = updated_restaurant.data()
+                     "WITH res, res.cuisine AS previous_cuisine\n"
+                     f"{set_clause}\n"
+                     "RETURN res, previous_cuisine")
+    try:
+        restaurant_data = await db.run(
+            cypher_update, {"restaurant_id": restaurant_id, **parameters}, name="restaurants.update"
+        )
+    except ConstraintError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Restaurant with name \"{new_attrs.name}\" already exists.")
 
     if not restaurant_data:
         raise HTTPException(
@@ -138,22 +318,27 @@ async def update_restaurant(restaurant_id, new_attrs: RestaurantUpdate):
             detail="Request data not found"
         )
     restaurant = Restaurant(**restaurant_data[0]["res"])
+    previous_cuisine = restaurant_data[0]["previous_cuisine"]
+    """Inactive (deleted) restaurants are on no leaderboard."""
+    if restaurant.cuisine != previous_cuisine and restaurant.active is not False:
+        await move_restaurant(restaurant_id, restaurant.likes or 0, previous_cuisine, restaurant.cuisine)
+    await response_cache.invalidate()
     return restaurant
 
 
 @router.delete("/{restaurant_id}")
-async def delete_restaurant(restaurant_id):
+async def delete_restaurant(restaurant_id, db: Database = Depends(get_db)):
     """Execute Cypher query to make Restaurant inactive."""
     cypher_update = ("MATCH (res: Restaurant) WHERE res.id = $restaurant_id\n"
                      "SET res.active=False\n"
                      "RETURN res")
-    with neo4j_driver.session() as session:
-        updated_restaurant = session.run(query=cypher_update, parameters={"restaurant_id": restaurant_id})
-        restaurant_data = updated_restaurant.data()
+    restaurant_data = await db.run(cypher_update, {"restaurant_id": restaurant_id}, name="restaurants.delete")
 
     if not restaurant_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Request data not found"
         )
+    await forget_restaurant(restaurant_id, restaurant_data[0]["res"].get("cuisine"))
+    await response_cache.invalidate()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
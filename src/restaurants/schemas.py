@@ -1,16 +1,36 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Any, List, Optional
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
 
 
+class GeoPoint(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+def parse_geo(value: Any) -> Any:
+    """Accept Neo4j points and "latitude,longitude" strings besides dicts."""
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    if isinstance(value, str):
+        try:
+            latitude, longitude = (float(part) for part in value.replace(";", ",").split(","))
+        except ValueError:
+            raise ValueError('geo must be {"latitude": ..., "longitude": ...} or "latitude,longitude"')
+        return {"latitude": latitude, "longitude": longitude}
+    return value
+
+
 class RestaurantOptional(BaseModel):
     about: Optional[str] = None
     phone_number: Optional[str] = None
     address: Optional[str] = None
-    geo: Optional[str] = None
+    geo: Optional[GeoPoint] = None
     email: Optional[str] = None
     cuisine: Optional[str] = None
 
+    _parse_geo = validator("geo", pre=True, allow_reuse=True)(parse_geo)
+
 
 # For update every parameter must be optional
 class RestaurantUpdate(RestaurantOptional):
@@ -27,6 +47,16 @@ class Restaurant(RestaurantCreate):
     active: Optional[bool] = None
     created_at: Optional[datetime] = None
     image: Optional[str] = None
+    likes: Optional[int] = 0
+
+
+# Any subset of Restaurant fields, see `fields` in GET /restaurants
+class RestaurantPartial(RestaurantUpdate):
+    id: Optional[str] = None
+    active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    image: Optional[str] = None
+    likes: Optional[int] = None
 
 
 class RestaurantShortInfo(BaseModel):
@@ -42,3 +72,42 @@ class RestaurantShortInfo(BaseModel):
                 "image": "some/path/to/the/image1.jpg"
             }
         }
+
+
+class BulkImportError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    received: int
+    created: int
+    failed: int
+    batches: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[BulkImportError]
+
+
+class LikeOperation(BaseModel):
+    restaurant_id: str
+    add: bool
+
+
+class LikeResult(LikeOperation):
+    # "liked", "unliked", "unchanged" or "not_found"
+    status: str
+
+
+class Recommendation(RestaurantShortInfo):
+    score: float
+
+
+class NearbyRestaurant(Restaurant):
+    # Meters from the searched point
+    distance: float
+
+
+class RestaurantSearchResult(Restaurant):
+    # Full-text relevance, higher is better
+    score: float
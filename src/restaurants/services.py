@@ -1,11 +1,392 @@
-from src.core.db import neo4j_driver
+import re
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+from fastapi import HTTPException, status
+from neo4j.spatial import WGS84Point
+from pydantic import ValidationError
 
-def restaurant_with_this_name_exists(name):
-    query = "MATCH (res:Restaurant) WHERE res.name=$name RETURN res"
+from src.core.db import Database
+from src.core.loader import Loaders
+from src.core.pagination import decode_cursor, encode_cursor
+from src.restaurants.leaderboard import cuisine_board, leaderboard, record_likes
+from src.restaurants.schemas import (
+    GeoPoint, LikeOperation, Restaurant, RestaurantCreate, RestaurantShortInfo, parse_geo,
+)
 
-    with neo4j_driver.session() as session:
-        restaurant_in_db = session.run(query=query, name=name)
-        restaurant_data = restaurant_in_db.data()
 
-    return bool(restaurant_data)
+RESTAURANT_FIELDS = list(Restaurant.__fields__)
+"""Shortcuts accepted by `fields` in addition to comma separated field names."""
+FIELD_SETS = {
+    "all": RESTAURANT_FIELDS,
+    "short": list(RestaurantShortInfo.__fields__),
+}
+
+
+def new_restaurant_attributes(new_restaurant: RestaurantCreate) -> Dict[str, Any]:
+    """Properties of a Restaurant node to create, with generated id and created_at."""
+    attributes = {
+        "id": str(uuid.uuid4()),
+        "created_at": str(datetime.utcnow()),
+        "active": True,
+        "likes": 0
+    }
+    attributes.update(dict(new_restaurant))
+    return neo4j_properties(attributes)
+
+
+def neo4j_properties(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """Restaurant properties as they are stored, `geo` becomes a WGS-84 point."""
+    geo = attributes.get("geo")
+    if geo is None:
+        return attributes
+    if not isinstance(geo, GeoPoint):
+        geo = GeoPoint.parse_obj(parse_geo(geo))
+    return {**attributes, "geo": WGS84Point((geo.longitude, geo.latitude))}
+
+
+def jsonable_properties(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    """Restaurant properties as read from Neo4j, with `geo` point turned into a dict."""
+    if attributes.get("geo") is None:
+        return attributes
+    return {**attributes, "geo": parse_geo(attributes["geo"])}
+
+
+"""Values of the Restaurant fields a node does not have, as `Restaurant` would fill them in."""
+RESTAURANT_DEFAULTS = {name: field.default for name, field in Restaurant.__fields__.items()}
+
+
+def trusted_restaurant(properties: Dict[str, Any], fields: List[str] = RESTAURANT_FIELDS) -> Dict[str, Any]:
+    """Restaurant properties read by our own queries, in the JSON shape of the Restaurant models.
+
+    Skips pydantic validation and `jsonable_encoder`, so it must only get nodes written by this API:
+    `created_at` is `str(datetime)` and becomes ISO 8601, `geo` a point or a "lat,lon" string.
+    """
+    restaurant = {field: properties.get(field, RESTAURANT_DEFAULTS[field]) for field in fields}
+    created_at = restaurant.get("created_at")
+    if isinstance(created_at, str):
+        restaurant["created_at"] = created_at.replace(" ", "T", 1)
+    elif isinstance(created_at, datetime):
+        restaurant["created_at"] = created_at.isoformat()
+    if restaurant.get("geo") is not None:
+        restaurant["geo"] = parse_geo(restaurant["geo"])
+    return restaurant
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Turn the `fields` query parameter into a list of Restaurant fields, raise 422 on unknown ones."""
+    if not fields:
+        return RESTAURANT_FIELDS
+    if fields in FIELD_SETS:
+        return FIELD_SETS[fields]
+
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in RESTAURANT_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown restaurant fields: {unknown}. Allowed: {RESTAURANT_FIELDS}"
+        )
+    return selected
+
+
+async def list_restaurants(
+    db: Database,
+    filters: Dict[str, Any],
+    fields: List[str],
+    limit: int,
+    cursor: Optional[str] = None,
+):
+    """Return a page of restaurants ordered by (created_at, id) and the cursor of the next page.
+
+    `filters` maps Restaurant properties to the exact values to match, None values are ignored.
+    Only `fields` properties are returned for each restaurant.
+    """
+    """A range on created_at, so the planner seeks the restaurant_created_at index, reads it in order and
+    stops after `limit` rows. Every restaurant is created with a created_at."""
+    conditions = ["res.created_at IS NOT NULL"]
+    tie_break = ""
+    parameters: Dict[str, Any] = {"limit": limit + 1}
+    for key, value in filters.items():
+        if value is not None:
+            conditions.append(f"res.{key} = ${key}")
+            parameters[key] = value
+    if cursor:
+        parameters["after_created_at"], parameters["after_id"] = decode_cursor(cursor, 2)
+        conditions[0] = "res.created_at >= $after_created_at"
+        """Only the rows sharing the cursor's created_at are left to compare by id."""
+        tie_break = "WITH res WHERE res.created_at > $after_created_at OR res.id > $after_id\n"
+
+    projection = ", ".join(f".{field}" for field in fields)
+    query = (f"MATCH (res:Restaurant) WHERE {' AND '.join(conditions)}\n"
+             f"{tie_break}"
+             "WITH res ORDER BY res.created_at, res.id LIMIT $limit\n"
+             f"RETURN res {{{projection}}} AS res, res.created_at AS created_at, res.id AS id")
+    rows = await db.read(query, parameters, name="restaurants.list")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1]["id"]])
+    items = [{field: row["res"].get(field) for field in fields} for row in rows]
+    return items, next_cursor
+
+
+async def ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Parse NDJSON from a byte stream, yielding (row number, document) as lines arrive.
+
+    Lines that are not valid JSON are yielded as the ValueError they raised, blank lines are skipped.
+    """
+    row, pending = 0, b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield row, _parse_json_line(line)
+                row += 1
+    if pending.strip():
+        yield row, _parse_json_line(pending)
+
+
+def _parse_json_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as err:
+        return err
+
+
+async def _merge_restaurants(tx, db: Database, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Create restaurants whose names are not taken yet, report which rows were created."""
+    query = """
+        UNWIND $rows AS row
+        MERGE (res:Restaurant {name: row.name})
+        ON CREATE SET res += row
+        RETURN row.id AS id, res.id = row.id AS created
+    """
+    return await db.run(query, {"rows": rows}, name="restaurants.bulk_merge", tx=tx)
+
+
+async def bulk_create_restaurants(
+    db: Database,
+    rows: AsyncIterator[Tuple[int, Any]],
+    batch_size: int,
+) -> Dict[str, Any]:
+    """Validate rows as RestaurantCreate and write them batch by batch, one transaction per batch.
+
+    Rows that fail validation or whose name is already taken are reported in `errors`.
+    """
+    started = time.perf_counter()
+    received = created = batches = 0
+    errors = []
+
+    async def write(batch: List[Tuple[int, Dict[str, Any]]]):
+        nonlocal created, batches
+        row_numbers = {attributes["id"]: row for row, attributes in batch}
+        """A session per batch, no connection is held while the rest of the upload is read at the client's pace."""
+        async with db.session() as session:
+            results = await session.execute_write(_merge_restaurants, db, [attributes for _, attributes in batch])
+        for result in results:
+            if result["created"]:
+                created += 1
+            else:
+                errors.append({"row": row_numbers[result["id"]], "error": "Restaurant with this name already exists."})
+        batches += 1
+
+    batch = []
+    async for row, document in rows:
+        received += 1
+        if isinstance(document, Exception):
+            errors.append({"row": row, "error": f"Invalid JSON: {document}"})
+            continue
+        try:
+            new_restaurant = RestaurantCreate.parse_obj(document)
+        except ValidationError as err:
+            errors.append({"row": row, "error": str(err)})
+            continue
+        batch.append((row, new_restaurant_attributes(new_restaurant)))
+        if len(batch) >= batch_size:
+            await write(batch)
+            batch = []
+    if batch:
+        await write(batch)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "received": received,
+        "created": created,
+        "failed": received - created,
+        "batches": batches,
+        "elapsed_seconds": elapsed,
+        "rows_per_second": created / elapsed if elapsed else 0.0,
+        "errors": sorted(errors, key=lambda error: error["row"]),
+    }
+
+
+def likes_after_unlike(removed: str) -> str:
+    """Cypher expression for `res.likes` after `removed` LIKES edges were deleted, never below 0."""
+    return f"CASE WHEN coalesce(res.likes, 0) > {removed} THEN res.likes - {removed} ELSE 0 END"
+
+
+async def apply_likes(db: Database, user_id: str, operations: List[LikeOperation]) -> List[Dict[str, Any]]:
+    """Like or unlike restaurants for the user in a single query, return the result of every operation.
+
+    Operations on the same restaurant collapse into the last one, so the outcome does not depend
+    on the order Cypher evaluates rows in.
+    """
+    final = {operation.restaurant_id: operation.add for operation in operations}
+    query = f"""
+        MATCH (u:User) WHERE u.id = $user_id
+        UNWIND $operations AS op
+        OPTIONAL MATCH (res:Restaurant) WHERE res.id = op.restaurant_id
+        OPTIONAL MATCH (u)-[existing:LIKES]->(res)
+        WITH u, op, res, collect(existing) AS existing
+        FOREACH (_ IN CASE WHEN op.add AND res IS NOT NULL AND size(existing) = 0 THEN [1] ELSE [] END |
+            MERGE (u)-[like:LIKES]->(res)
+            ON CREATE SET like.liked_at = $liked_at
+            SET res.likes = coalesce(res.likes, 0) + 1)
+        FOREACH (_ IN CASE WHEN NOT op.add AND size(existing) > 0 THEN [1] ELSE [] END |
+            SET res.likes = {likes_after_unlike("size(existing)")})
+        FOREACH (r IN CASE WHEN op.add THEN [] ELSE existing END | DELETE r)
+        RETURN op.restaurant_id AS restaurant_id, res IS NOT NULL AS found, size(existing) > 0 AS existed,
+               coalesce(res.likes, 0) AS likes, res.cuisine AS cuisine, coalesce(res.active, true) AS active
+    """
+    parameters = {
+        "user_id": user_id,
+        "liked_at": str(datetime.utcnow()),
+        "operations": [{"restaurant_id": key, "add": add} for key, add in final.items()],
+    }
+    statuses = {}
+    for row in await db.run(query, parameters, name="restaurants.apply_likes"):
+        add = final[row["restaurant_id"]]
+        if not row["found"]:
+            outcome = "not_found"
+        elif add == row["existed"]:
+            outcome = "unchanged"
+        else:
+            outcome = "liked" if add else "unliked"
+            """Deleted restaurants were taken off the leaderboards, a late like must not put them back."""
+            if row["active"]:
+                await record_likes(row["restaurant_id"], row["likes"], row["cuisine"])
+        statuses[row["restaurant_id"]] = outcome
+
+    return [
+        {
+            "restaurant_id": operation.restaurant_id,
+            "add": operation.add,
+            "status": statuses.get(operation.restaurant_id, "not_found"),
+        }
+        for operation in operations
+    ]
+
+
+async def top_restaurants(loaders: Loaders, cuisine: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Most liked restaurants, of the cuisine if given, read from the leaderboard."""
+    ranked = await leaderboard.top(cuisine_board(cuisine), limit)
+    restaurants = await loaders.restaurants.load_many(restaurant_id for restaurant_id, _ in ranked)
+    return [restaurant for restaurant in restaurants if restaurant is not None]
+
+
+async def nearby_restaurants(
+    db: Database,
+    latitude: float,
+    longitude: float,
+    radius: float,
+    limit: int,
+    cursor: Optional[str] = None,
+):
+    """Return a page of active restaurants within `radius` meters, closest first, and the next page cursor.
+
+    The distance predicate is answered by the index on Restaurant.geo.
+    """
+    parameters: Dict[str, Any] = {
+        "center": WGS84Point((longitude, latitude)),
+        "radius": radius,
+        "limit": limit + 1,
+    }
+    after = ""
+    if cursor:
+        parameters["after_distance"], parameters["after_id"] = decode_cursor(cursor, 2)
+        after = "WHERE distance > $after_distance OR (distance = $after_distance AND res.id > $after_id)"
+    query = f"""
+        MATCH (res:Restaurant)
+        WHERE distance(res.geo, $center) <= $radius AND coalesce(res.active, true)
+        WITH res, distance(res.geo, $center) AS distance
+        {after}
+        RETURN res, distance
+        ORDER BY distance, res.id
+        LIMIT $limit
+    """
+    rows = await db.read(query, parameters, name="restaurants.nearby")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["distance"], rows[-1]["res"]["id"]])
+    items = [{**row["res"], "distance": row["distance"]} for row in rows]
+    return items, next_cursor
+
+
+"""Characters with a meaning in Lucene query syntax."""
+LUCENE_SPECIAL = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/])')
+
+
+def fulltext_query(text: str, fuzzy: bool = True) -> str:
+    """Lucene query matching any of the words in `text`, as a prefix or, if fuzzy, with typos."""
+    clauses = []
+    for word in text.lower().split():
+        word = LUCENE_SPECIAL.sub(r"\\\1", word)
+        clauses.append(f"({word}* OR {word}~)" if fuzzy else f"{word}*")
+    return " ".join(clauses)
+
+
+async def search_restaurants(db: Database, text: str, fuzzy: bool, limit: int, cursor: Optional[str] = None):
+    """Return a page of active restaurants matching `text` in name, about or cuisine, best first."""
+    if not text.split():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Empty search query")
+    skip = decode_cursor(cursor, 1)[0] if cursor else 0
+    """JSON true and false decode to bool, a subclass of int."""
+    if isinstance(skip, bool) or not isinstance(skip, int) or skip < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: '{cursor}'")
+    query = """
+        CALL db.index.fulltext.queryNodes("restaurant_search", $query) YIELD node, score
+        WHERE coalesce(node.active, true)
+        RETURN node AS res, score
+        SKIP $skip LIMIT $limit
+    """
+    parameters = {"query": fulltext_query(text, fuzzy), "skip": skip, "limit": limit + 1}
+    rows = await db.read(query, parameters, name="restaurants.search")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([skip + limit])
+    items = [{**row["res"], "score": row["score"]} for row in rows]
+    return items, next_cursor
+
+
+async def restaurant_likers(db: Database, restaurant_id: str, limit: int, cursor: Optional[str] = None):
+    """Return a page of ids of users who liked the restaurant, latest likes first, and the next page cursor."""
+    parameters: Dict[str, Any] = {"restaurant_id": restaurant_id, "limit": limit + 1}
+    after = ""
+    if cursor:
+        parameters["after_liked_at"], parameters["after_id"] = decode_cursor(cursor, 2)
+        after = "WHERE liked_at < $after_liked_at OR (liked_at = $after_liked_at AND u.id < $after_id)"
+    query = f"""
+        MATCH (u:User)-[like:LIKES]->(res:Restaurant) WHERE res.id = $restaurant_id
+        WITH u, coalesce(like.liked_at, "") AS liked_at
+        {after}
+        RETURN u.id AS id, liked_at
+        ORDER BY liked_at DESC, id DESC
+        LIMIT $limit
+    """
+    rows = await db.read(query, parameters, name="restaurants.likers")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["liked_at"], rows[-1]["id"]])
+    return [{"id": row["id"]} for row in rows], next_cursor
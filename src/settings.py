@@ -1,6 +1,7 @@
 import os
 import logging
 import logging.config
+from typing import Optional
 
 from pydantic import BaseSettings
 
@@ -9,6 +10,7 @@ class Settings(BaseSettings):
     api_prefix: str
     debug: str
     logger_config: str
+    # neo4j:// routes reads to followers and read replicas of a cluster, bolt:// talks to a single server
     neo4j_uri: str
     neo4j_username: str
     neo4j_password: str
@@ -16,6 +18,83 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
 
+    # On startup Neo4j is polled with exponential backoff for at most `startup_timeout_seconds`,
+    # then `pool_warmup` connections are opened. GET /readyz fails if a query takes over `readiness_timeout_seconds`.
+    neo4j_startup_timeout_seconds: float = 60
+    neo4j_pool_warmup: int = 10
+    readiness_timeout_seconds: float = 2
+
+    # Neo4j driver: connections, timeouts in seconds, records fetched per batch
+    # and how long read transactions are retried on transient errors.
+    neo4j_max_connection_pool_size: int = 100
+    neo4j_connection_acquisition_timeout: float = 60
+    neo4j_connection_timeout: float = 30
+    neo4j_max_connection_lifetime: float = 3600
+    neo4j_fetch_size: int = 1000
+    neo4j_max_transaction_retry_time: float = 15
+    # Database of the sessions, the server's default one if not set
+    neo4j_database: Optional[str] = None
+
+    # Authenticated users cache, TTL in seconds. 0 disables the cache.
+    user_cache_size: int = 10000
+    user_cache_ttl: int = 60
+
+    # Verified JWT claims cache, by token digest. Entries never outlive the token's `exp`.
+    token_cache_enabled: bool = True
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 300
+
+    # bcrypt runs in a dedicated thread pool: at most `workers` hashes at once and
+    # `queue_size` more waiting, further requests are rejected with 503.
+    password_hash_workers: int = 4
+    password_hash_queue_size: int = 64
+
+    # Page sizes of list endpoints
+    page_size: int = 50
+    max_page_size: int = 500
+
+    # Largest radius of GET /restaurants/nearby, in meters
+    max_nearby_radius: int = 50000
+
+    # Rows written per transaction by POST /restaurants/bulk
+    bulk_batch_size: int = 1000
+    max_bulk_batch_size: int = 10000
+
+    # Operations accepted by POST /restaurants/likes
+    max_like_batch_size: int = 500
+
+    # Restaurant similarity used by recommendations is recomputed every `refresh_seconds`
+    recommendations_refresh_seconds: int = 600
+    recommendations_top_k: int = 50
+    max_recommendations: int = 100
+
+    # Like counters are recounted from LIKES edges and leaderboards reloaded every `reconcile_seconds`.
+    # Leaderboards are kept in process unless `redis_url` is set (needs the `redis` package).
+    likes_reconcile_seconds: int = 3600
+    redis_url: Optional[str] = None
+
+    # Cached restaurant read responses, shared through Redis if `redis_url` is set. TTL in seconds.
+    response_cache_size: int = 1000
+    response_cache_ttl: int = 30
+
+    # GET /restaurants and /restaurants/top build JSON from the rows of our own queries without
+    # validating them into pydantic models. JSON is encoded with orjson if it is installed.
+    trusted_responses: bool = False
+
+    # Queries slower than `slow_query_ms` are logged with redacted parameters. A `profile_sample_rate`
+    # share of the queries runs with PROFILE, their plans are listed by GET /query-profiles.
+    slow_query_ms: int = 500
+    profile_sample_rate: float = 0.0
+
+    # GET /q runs read only queries: server side timeout, records returned at most, queries a user may run at once.
+    # Before running, the EXPLAIN plan is rejected if it has an unbounded variable length expansion
+    # or a cartesian product estimated above `max_estimated_rows`.
+    cypher_timeout_seconds: float = 5
+    cypher_max_rows: int = 1000
+    cypher_max_concurrency_per_user: int = 2
+    cypher_explain_check: bool = True
+    cypher_max_estimated_rows: int = 1000000
+
 
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 basic_env_file, local_env_file = ".env", ".env.local"
@@ -3,12 +3,23 @@ import uuid
 import shutil
 from datetime import datetime
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
-
-from src.auth.services import get_current_active_user, create_password_hash, verify_password
-from src.core.db import neo4j_driver
-from src.core.schemas import GUID
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status, File, UploadFile
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from src.auth.services import (
+    get_current_active_user, get_current_admin_user, create_password_hash, forget_access_token, verify_password,
+    user_cache,
+)
+from src.core.db import Database, get_db
+from src.core.loader import Loaders, get_loaders
+from src.core.query import set_properties
+from src.core.schemas import GUID, Page
+from src.core.streaming import ndjson_response
+from src.settings import settings
+from src.restaurants.recommendations import recommend_restaurants
+from src.restaurants.schemas import Recommendation, RestaurantShortInfo
+from src.users.services import liked_restaurants
 from src.users.schemas import User, UserChangePassword, UserInDB, UserUpdate
 
 
@@ -24,59 +35,71 @@ async def my_profile(current_user: User = Depends(get_current_active_user)):
 @router.post("/change-password", status_code=status.HTTP_200_OK)
 async def change_password(
     user_change_pass: UserChangePassword,
-    current_user: UserInDB = Depends(get_current_active_user)
+    current_user: UserInDB = Depends(get_current_active_user),
+    token: HTTPAuthorizationCredentials = Depends(HTTPBearer()),
+    db: Database = Depends(get_db)
 ):
     """Change User's password."""
     old_password, new_password = user_change_pass.old_password, user_change_pass.new_password
-    old_password_hash = current_user.hashed_password
     user_id = current_user.id
 
+    """current_user may come from user_cache, the old password is checked against the stored hash.
+    A write session, so the hash is read from the leader and not from a lagging follower."""
+    query_password_hash = "MATCH (user:User) WHERE user.id = $user_id RETURN user.hashed_password AS hashed_password"
+    stored = await db.run(query_password_hash, {"user_id": user_id}, name="users.password_hash")
+    old_password_hash = stored[0]["hashed_password"] if stored else None
+
     """Checking if user entered correct old_password, if not - raise 400."""
-    if not verify_password(old_password, old_password_hash):
+    if old_password_hash is None or not await verify_password(old_password, old_password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Wrong old_password was provided"
         )
 
-    new_password_hash = create_password_hash(new_password)
+    new_password_hash = await create_password_hash(new_password)
     query_change_password = """
         MATCH (user:User) WHERE user.id = $user_id
         SET user.hashed_password = $new_password_hash
         RETURN user
     """
 
-    with neo4j_driver.session() as session:
-        """Changing password with a new one."""
-        session.run(query_change_password, user_id=user_id, new_password_hash=new_password_hash)
+    """Changing password with a new one. Cached entries are dropped before the write, so a request
+    cancelled once the write is sent cannot leave the old user cached."""
+    user_cache.delete(user_id)
+    forget_access_token(token.credentials)
+    parameters = {"user_id": user_id, "new_password_hash": new_password_hash}
+    await db.run(query_change_password, parameters, name="users.change_password")
 
     return {"detail": "Password successfully updated"}
 
 
+@router.get("/export", dependencies=[Depends(get_current_admin_user)])
+async def export_users(gzip: bool = False, db: Database = Depends(get_db)):
+    """Stream all the users as NDJSON, one user per line. Admins only."""
+    projection = ", ".join(f".{field}" for field in User.__fields__)
+    query = f"MATCH (user:User) RETURN user {{{projection}}} AS user"
+    users = (record["user"] async for record in db.stream(query, name="users.export"))
+    return ndjson_response(users, filename="users", compress=gzip)
+
 
 @router.get("/{user_id}")
-async def get_profile(user_id: str):
-    """Write Cypher query and run against the database."""
-    query = "MATCH (user:User) WHERE user.id = $user_id RETURN user"
-
-    with neo4j_driver.session() as session:
-        user_in_db = session.run(query=query, parameters={"user_id": user_id})
-        try:
-            user_data = user_in_db.data()[0]["user"]
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail=f"Operation not permitted, user with id {user_id} doesn't exists.",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
+async def get_profile(user_id: str, loaders: Loaders = Depends(get_loaders)):
+    """Load the user, batched with other lookups of this request."""
+    user_data = await loaders.users.load(user_id)
+    if user_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Operation not permitted, user with id {user_id} doesn't exists.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
 
     return User(**user_data)
 
 
 @router.patch("/{user_id}")
-async def update_profile(user_id: str, attributes: UserUpdate):
+async def update_profile(user_id: str, attributes: UserUpdate, db: Database = Depends(get_db)):
     """Add check to stop call if password is being changed."""
-    attributes = dict(attributes)
-    for k in attributes:
+    for k in dict(attributes):
         if k == "hashed_password":
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -84,22 +107,40 @@ async def update_profile(user_id: str, attributes: UserUpdate):
                 headers={"WWW-Authenticate": "Bearer"}
             )
 
-    if attributes:
-        unpacked_attributes = (
-            "SET " + ", ".join(f"user.{key}=\"{value}\"" for (key, value) in attributes.items() if value)
-        )
-    else:
-        unpacked_attributes = ""
-
-    """Execute Cypher query to reset the hashed_password attribute."""
-    cypher_update_user = f"MATCH (user: User) WHERE user.id = $user_id {unpacked_attributes} RETURN user"
+    """Only UserUpdate fields can be set, values are passed as query parameters."""
+    set_clause, parameters = set_properties("user", attributes, allowed=UserUpdate.__fields__)
+    cypher_update_user = f"MATCH (user: User) WHERE user.id = $user_id {set_clause} RETURN user"
 
-    with neo4j_driver.session() as session:
-        updated_user = session.run(
-            query=cypher_update_user,
-            parameters={"user_id": user_id}
-        )
-        user_data = updated_user.data()[0]["user"]
+    updated_user = await db.run(cypher_update_user, {"user_id": user_id, **parameters}, name="users.update_profile")
+    user_cache.delete(user_id)
+    user_data = updated_user[0]["user"]
 
     user = User(**user_data)
     return user
+
+
+@router.get("/{user_id}/likes", response_model=Page[RestaurantShortInfo])
+async def get_likes(
+    user_id: str,
+    limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_db)
+):
+    """Restaurants liked by the user, latest likes first.<br/>
+       Pass `next_cursor` of the previous page as `cursor` to get the next one.
+    """
+    items, next_cursor = await liked_restaurants(db, user_id, limit, cursor)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{user_id}/recommendations", response_model=List[Recommendation])
+async def get_recommendations(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=settings.max_recommendations),
+    db: Database = Depends(get_db),
+    loaders: Loaders = Depends(get_loaders)
+):
+    """Restaurants liked by users who liked the same restaurants as this user, best first.<br/>
+       Similarity is precomputed every RECOMMENDATIONS_REFRESH_SECONDS, so new likes show up with a delay.
+    """
+    return await recommend_restaurants(db, loaders, user_id, limit)
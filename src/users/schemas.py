@@ -12,6 +12,7 @@ class User(UserUpdate):
     id: str
     email: str
     is_active: bool
+    is_admin: bool = False
     joined: datetime
 
 
@@ -0,0 +1,31 @@
+from typing import Any, Dict, Optional
+
+from src.core.db import Database
+from src.core.pagination import decode_cursor, encode_cursor
+
+
+async def liked_restaurants(db: Database, user_id: str, limit: int, cursor: Optional[str] = None):
+    """Return a page of restaurants liked by the user, latest likes first, and the next page cursor.
+
+    Restaurants are returned as RestaurantShortInfo fields, resolved in the same traversal.
+    """
+    parameters: Dict[str, Any] = {"user_id": user_id, "limit": limit + 1}
+    after = ""
+    if cursor:
+        parameters["after_liked_at"], parameters["after_id"] = decode_cursor(cursor, 2)
+        after = "WHERE liked_at < $after_liked_at OR (liked_at = $after_liked_at AND res.id < $after_id)"
+    query = f"""
+        MATCH (u:User)-[like:LIKES]->(res:Restaurant) WHERE u.id = $user_id
+        WITH res, coalesce(like.liked_at, "") AS liked_at
+        {after}
+        RETURN res {{.id, .name, .image}} AS res, liked_at
+        ORDER BY liked_at DESC, res.id DESC
+        LIMIT $limit
+    """
+    rows = await db.read(query, parameters, name="users.liked_restaurants")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["liked_at"], rows[-1]["res"]["id"]])
+    return [row["res"] for row in rows], next_cursor
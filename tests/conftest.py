@@ -0,0 +1,37 @@
+"""Settings the app needs to import, unless the environment or an .env file provides them,
+and the Neo4j stand-in of `benchmarks.standin` as the app's database."""
+import os
+
+import pytest
+
+
+for name, value in {
+    "API_PREFIX": "/api/v1",
+    "DEBUG": "False",
+    "LOGGER_CONFIG": "./logging.conf",
+    "NEO4J_URI": "neo4j://localhost:7687",
+    "NEO4J_USERNAME": "neo4j",
+    "NEO4J_PASSWORD": "password",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "10080",
+    "SECRET_KEY": "test-secret-key",
+    "ALGORITHM": "HS256",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def db():
+    from benchmarks.load import PASSWORD
+    from benchmarks.standin import StandInDatabase, seed_graph
+    from src.auth.services import pwd_context
+    from src.core.db import get_db
+    from src.main import app
+
+    db = StandInDatabase(seed_graph(users=5, restaurants=20, password_hash=pwd_context.hash(PASSWORD)))
+
+    async def get_standin_db():
+        return db
+
+    app.dependency_overrides[get_db] = get_standin_db
+    yield db
+    app.dependency_overrides.clear()
@@ -0,0 +1,117 @@
+"""Read/write routing of the queries and the X-Neo4j-Bookmark round trip, against the Neo4j stand-in."""
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import pytest
+from neo4j import READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import Neo4jError
+
+from benchmarks.load import ASGIClient, Workload
+from src.auth.services import create_access_token
+from src.core.bookmarks import BOOKMARK_HEADER, MAX_BOOKMARKS
+from src.core.db import Database, get_db
+from src.main import app
+
+
+@pytest.fixture
+def workload(db):
+    tokens = {user_id: create_access_token({"sub": user_id}, timedelta(hours=1)) for user_id in db.graph.users}
+    return Workload(ASGIClient(app), db, tokens)
+
+
+def test_query_access_modes(db, workload):
+    async def run_every_scenario():
+        rng = random.Random(0)
+        for scenario in ("sign_in", "list", "get", "create", "me"):
+            label, status = await getattr(workload, scenario)(rng, "user-0")
+            assert status < 400, label
+        for add in ("true", "false"):
+            query = {"user_id": "user-0", "add": add}
+            status, _, _ = await workload.client.request("POST", "/restaurants/restaurant-0/like", query=query)
+            assert status == 200
+
+    asyncio.run(run_every_scenario())
+    assert db.access_modes == {
+        "auth.get_user_by_email": READ_ACCESS,
+        "loader.User.id": READ_ACCESS,
+        "loader.Restaurant.id": READ_ACCESS,
+        "restaurants.list": READ_ACCESS,
+        "restaurants.create": WRITE_ACCESS,
+        "restaurants.like": WRITE_ACCESS,
+        "restaurants.unlike": WRITE_ACCESS,
+    }
+
+
+def test_bookmark_round_trip(db):
+    client = ASGIClient(app)
+
+    async def write_then_read():
+        status, _, headers = await client.request(
+            "POST", "/restaurants/restaurant-0/like", query={"user_id": "user-0", "add": "true"}
+        )
+        assert status == 200
+        bookmark = headers[BOOKMARK_HEADER.lower()]
+
+        status, _, headers = await client.request("GET", "/restaurants/", headers={BOOKMARK_HEADER: bookmark})
+        assert status == 200
+        assert BOOKMARK_HEADER.lower() not in headers
+        return bookmark
+
+    bookmark = asyncio.run(write_then_read())
+    assert bookmark == "standin:1"
+    assert db.waited_for["restaurants.list"] == [bookmark]
+
+
+@pytest.mark.parametrize("header", [
+    ",".join(f"standin:{i}" for i in range(MAX_BOOKMARKS + 1)),
+    "x" * 257,
+    "not a bookmark",
+])
+def test_malformed_bookmarks_are_rejected(db, header):
+    status, _, _ = asyncio.run(ASGIClient(app).request("GET", "/restaurants/", headers={BOOKMARK_HEADER: header}))
+    assert status == 400
+    assert db.queries == {}
+
+
+class RejectingDriver:
+    """Driver whose transactions fail with the given server error, like one given a bad bookmark."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.sessions = []
+
+    @asynccontextmanager
+    async def session(self, **config):
+        self.sessions.append(config)
+        yield self
+
+    async def execute_read(self, work, *args):
+        raise Neo4jError._hydrate_neo4j(code=self.code, message="Rejected bookmark")
+
+
+@pytest.mark.parametrize("code", [
+    "Neo.ClientError.Transaction.InvalidBookmark",
+    "Neo.TransientError.Transaction.BookmarkTimeout",
+])
+def test_rejected_bookmarks_are_bad_requests(code):
+    database = Database("neo4j://localhost:7687", "neo4j", "password")
+    database.driver = driver = RejectingDriver(code)
+
+    async def get_rejecting_db():
+        return database
+
+    async def read_with_bookmark():
+        database.slots = asyncio.Semaphore(1)
+        return await ASGIClient(app).request("GET", "/restaurants/restaurant-0", headers={BOOKMARK_HEADER: "FB:future"})
+
+    app.dependency_overrides[get_db] = get_rejecting_db
+    try:
+        status, _, _ = asyncio.run(read_with_bookmark())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert status == 400
+    """A made up future bookmark fails once, it is not retried while holding a connection slot."""
+    assert driver.sessions[0]["max_transaction_retry_time"] == 0
@@ -0,0 +1,81 @@
+"""POST /restaurants/bulk, with the request body and the database faked."""
+import json
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.restaurants.routes import bulk_create
+
+
+def json_request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {"type": "http", "method": "POST", "path": "/restaurants/bulk", "query_string": b"",
+             "headers": [(b"content-type", b"application/json")]}
+    return Request(scope, receive)
+
+
+class RecordingTransaction:
+    """Answers the bulk MERGE as if no name was taken."""
+
+    def __init__(self, db: "RecordingDatabase"):
+        self.db = db
+
+    async def run(self, query, parameters):
+        self.db.batches.append([row["name"] for row in parameters["rows"]])
+        return self
+
+    async def data(self):
+        return [{"id": row_id, "created": True} for row_id in self.db.pending()]
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.sessions = 0
+        self.open_sessions = 0
+        self.batches = []
+        self.rows = []
+
+    def pending(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    @asynccontextmanager
+    async def session(self, **config):
+        self.sessions += 1
+        self.open_sessions += 1
+        try:
+            yield self
+        finally:
+            self.open_sessions -= 1
+
+    async def execute_write(self, work, db, rows):
+        self.rows = [row["id"] for row in rows]
+        return await work(RecordingTransaction(self), db, rows)
+
+    async def run(self, query, parameters=None, name="unnamed", tx=None):
+        result = await tx.run(query, parameters)
+        return await result.data()
+
+
+def test_invalid_json_is_unprocessable():
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(bulk_create(json_request(b'[{"name": "Cut'), batch_size=2, db=RecordingDatabase()))
+    assert raised.value.status_code == 422
+    assert raised.value.detail.startswith("Invalid JSON")
+
+
+def test_rows_are_written_one_session_per_batch():
+    db = RecordingDatabase()
+    documents = [{"name": f"Bulk {i}", "cuisine": "italian"} for i in range(5)] + [{"about": "No name"}]
+    request = json_request(json.dumps(documents).encode())
+    result = asyncio.run(bulk_create(request, batch_size=2, db=db))
+
+    assert (result["received"], result["created"], result["failed"], result["batches"]) == (6, 5, 1, 3)
+    assert [error["row"] for error in result["errors"]] == [5]
+    assert db.batches == [["Bulk 0", "Bulk 1"], ["Bulk 2", "Bulk 3"], ["Bulk 4"]]
+    assert db.sessions == 3 and db.open_sessions == 0
@@ -0,0 +1,82 @@
+"""EXPLAIN plan checks and the row cap of GET /q."""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import cypher
+from src.core.cypher import _read, check_plan
+from src.settings import settings
+
+
+def plan(operator, details="", estimated_rows=1):
+    return {
+        "operatorType": "ProduceResults@neo4j",
+        "args": {"Details": "p"},
+        "children": [
+            {"operatorType": f"{operator}@neo4j", "args": {"Details": details, "EstimatedRows": estimated_rows}},
+        ],
+    }
+
+
+@pytest.mark.parametrize("operator, details", [
+    ("VarLengthExpand(All)", "(a)-[anon_0*]->(b)"),
+    ("VarLengthExpand(Pruning)", "(a)-[anon_0*2..]->(b)"),
+    ("ShortestPath", "p = (a)-[anon_0*]-(b)"),
+    ("ShortestPath", "p = (a)-[anon_0*1..]-(b)"),
+    ("StatefulShortestPath(All)", "SHORTEST 1 (a) ((`anon_1`)-[`anon_0`]-(`anon_2`))+ (b)"),
+])
+def test_unbounded_expansions_are_rejected(operator, details):
+    assert check_plan(plan(operator, details))
+
+
+@pytest.mark.parametrize("operator, details", [
+    ("VarLengthExpand(All)", "(a)-[anon_0*..5]->(b)"),
+    ("VarLengthExpand(All)", "(a)-[anon_0*3]->(b)"),
+    ("ShortestPath", "p = (a)-[anon_0*..6]-(b)"),
+    ("ShortestPath", "p = allShortestPaths((a)-[anon_0*1..4]-(b))"),
+    ("Expand(All)", "(a)-[anon_0]->(b)"),
+])
+def test_bounded_expansions_pass(operator, details):
+    assert check_plan(plan(operator, details)) is None
+
+
+def test_large_cartesian_products_are_rejected():
+    assert check_plan(plan("CartesianProduct", estimated_rows=settings.cypher_max_estimated_rows + 1))
+    assert check_plan(plan("CartesianProduct", estimated_rows=settings.cypher_max_estimated_rows)) is None
+
+
+class RowsDatabase:
+    """Answers EXPLAIN with an empty plan and every other query with `count` records."""
+
+    def __init__(self, count):
+        self.count = count
+        self.read = 0
+
+    @asynccontextmanager
+    async def query(self, query, parameters=None, name="unnamed", tx=None):
+        if query.startswith("EXPLAIN"):
+            async def consume():
+                return SimpleNamespace(plan={"operatorType": "ProduceResults"})
+
+            yield SimpleNamespace(consume=consume)
+            return
+
+        async def records():
+            for number in range(self.count):
+                self.read += 1
+                yield SimpleNamespace(data=lambda number=number: {"n": number})
+
+        yield records()
+
+
+@pytest.mark.parametrize("count, truncated", [(3, False), (4, False), (5, True)])
+def test_rows_are_capped(monkeypatch, count, truncated):
+    monkeypatch.setattr(cypher.settings, "cypher_max_rows", 4)
+    db = RowsDatabase(count)
+    rows, was_truncated = asyncio.run(_read(None, db, "MATCH (n) RETURN n"))
+
+    assert rows == [{"n": number} for number in range(min(count, 4))]
+    assert was_truncated is truncated
+    assert db.read <= 5
@@ -0,0 +1,50 @@
+"""Database.warm_up against a faked driver."""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from src.core import db as database
+from src.core.db import Database
+
+
+class CountingDriver:
+    """Counts the sessions open at once, each answers RETURN 1."""
+
+    def __init__(self):
+        self.open = 0
+        self.most_open = 0
+
+    @asynccontextmanager
+    async def session(self, **config):
+        self.open += 1
+        self.most_open = max(self.most_open, self.open)
+        try:
+            yield self
+        finally:
+            self.open -= 1
+
+    async def run(self, query):
+        return self
+
+    async def consume(self):
+        return None
+
+
+def warm_up(connections):
+    db = Database("neo4j://localhost:7687", "neo4j", "password")
+    db.driver = CountingDriver()
+    asyncio.run(db.warm_up(connections))
+    return db.driver
+
+
+def test_warm_up_holds_a_connection_per_session():
+    assert warm_up(3).most_open == 3
+
+
+def test_warm_up_is_clamped_to_the_pool_size(monkeypatch, caplog):
+    monkeypatch.setattr(database.settings, "neo4j_max_connection_pool_size", 4)
+    with caplog.at_level(logging.WARNING, logger=database.__name__):
+        driver = warm_up(10)
+
+    assert driver.most_open == 4
+    assert "warming up 4 connections" in caplog.text
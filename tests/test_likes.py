@@ -0,0 +1,113 @@
+"""Like counts of add_like and apply_likes, and the leaderboard entries they update."""
+import json
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from benchmarks.load import ASGIClient
+from src.auth.services import create_access_token
+from src.main import app
+from src.restaurants import leaderboard as leaderboards
+from src.restaurants.leaderboard import ALL, LocalLeaderboard, cuisine_board
+from src.restaurants.routes import add_like, update_restaurant
+from src.restaurants.schemas import LikeOperation, RestaurantUpdate
+from src.restaurants.services import apply_likes, likes_after_unlike
+
+
+class AnsweringDatabase:
+    """Answers every query with the given rows and records the query texts."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def run(self, query, parameters=None, **kwargs):
+        self.queries.append(query)
+        return self.rows
+
+
+@pytest.fixture
+def board(monkeypatch):
+    board = LocalLeaderboard()
+    monkeypatch.setattr(leaderboards, "leaderboard", board)
+    return board
+
+
+def test_like_of_inactive_restaurant_keeps_it_off_the_leaderboard(board):
+    db = AnsweringDatabase([{"r": {}, "likes": 3, "cuisine": "italian", "active": False}])
+    asyncio.run(add_like("restaurant-0", "user-0", True, db=db))
+    assert asyncio.run(board.top(ALL, 10)) == []
+
+
+def test_cuisine_change_moves_the_leaderboard_entry(board):
+    asyncio.run(board.set(cuisine_board("thai"), "restaurant-0", 5))
+    restaurant = {"id": "restaurant-0", "name": "Restaurant", "cuisine": "italian", "likes": 5}
+    db = AnsweringDatabase([{"res": restaurant, "previous_cuisine": "thai"}])
+    asyncio.run(update_restaurant("restaurant-0", RestaurantUpdate(cuisine="italian"), db=db))
+
+    assert asyncio.run(board.top(cuisine_board("thai"), 10)) == []
+    assert asyncio.run(board.top(cuisine_board("italian"), 10)) == [("restaurant-0", 5)]
+
+
+def test_batch_likes_update_active_restaurants_only(board):
+    liked = {"found": True, "existed": False, "likes": 1, "cuisine": None}
+    db = AnsweringDatabase([
+        {"restaurant_id": "restaurant-0", **liked, "active": True},
+        {"restaurant_id": "restaurant-1", **liked, "active": False},
+    ])
+    operations = [LikeOperation(restaurant_id=f"restaurant-{i}", add=True) for i in range(2)]
+    results = asyncio.run(apply_likes(db, "user-0", operations))
+
+    assert [result["status"] for result in results] == ["liked", "liked"]
+    assert asyncio.run(board.top(ALL, 10)) == [("restaurant-0", 1)]
+
+
+def test_both_unlike_paths_clamp_the_count(board):
+    unliked = {"likes": 0, "cuisine": None, "active": True}
+    db = AnsweringDatabase([{"u": {}, **unliked}])
+    asyncio.run(add_like("restaurant-0", "user-0", False, db=db))
+    db.rows = [{"restaurant_id": "restaurant-0", "found": True, "existed": True, **unliked}]
+    asyncio.run(apply_likes(db, "user-0", [LikeOperation(restaurant_id="restaurant-0", add=False)]))
+
+    single, batch = db.queries
+    assert likes_after_unlike("1") in single
+    assert likes_after_unlike("size(existing)") in batch
+    assert "coalesce(res.likes, 0) AS likes" in single and "coalesce(res.likes, 0) AS likes" in batch
+
+
+def test_batch_likes_through_the_app(db, board):
+    user_id = next(iter(db.graph.users))
+    restaurant_id = next(iter(db.graph.restaurants))
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id}, timedelta(minutes=5))}"}
+    operations = [{"restaurant_id": restaurant_id, "add": True}, {"restaurant_id": "missing", "add": True}]
+    request = ASGIClient(app).request("POST", "/restaurants/likes", json_body=operations, headers=headers)
+    status, body, _ = asyncio.run(request)
+
+    assert status == 200
+    assert [result["status"] for result in json.loads(body)] == ["liked", "not_found"]
+    assert (user_id, restaurant_id) in db.graph.likes
+
+
+def test_likes_change_the_etag(db, board):
+    client = ASGIClient(app)
+    user_ids = list(db.graph.users)
+    restaurant_id = next(iter(db.graph.restaurants))
+
+    async def etag():
+        status, _, headers = await client.request("GET", f"/restaurants/{restaurant_id}")
+        assert status == 200
+        return headers["etag"]
+
+    async def likes():
+        before = await etag()
+        query = {"user_id": user_ids[0], "add": "true"}
+        await client.request("POST", f"/restaurants/{restaurant_id}/like", query=query)
+        liked = await etag()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': user_ids[1]})}"}
+        await client.request("POST", "/restaurants/likes", json_body=[{"restaurant_id": restaurant_id, "add": True}],
+                             headers=headers)
+        return before, liked, await etag()
+
+    before, liked, batch_liked = asyncio.run(likes())
+    assert len({before, liked, batch_liked}) == 3
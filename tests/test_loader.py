@@ -0,0 +1,57 @@
+"""NodeLoader batching and memoization, with the database faked."""
+import asyncio
+
+from src.core.loader import NodeLoader
+
+
+class NodesDatabase:
+    """Answers loader queries from the given nodes and records the values of every query."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.queries = []
+
+    async def read(self, query, parameters=None, name="unnamed"):
+        self.queries.append(parameters["values"])
+        return [{"node": self.nodes[value]} for value in parameters["values"] if value in self.nodes]
+
+
+NODES = {f"user-{number}": {"id": f"user-{number}", "email": f"user{number}@example.com"} for number in range(3)}
+
+
+def test_loads_of_one_tick_share_a_query():
+    db = NodesDatabase(NODES)
+
+    async def load():
+        loader = NodeLoader(db, "User")
+        return await asyncio.gather(loader.load("user-0"), loader.load("user-2"), loader.load_many(["user-1"]))
+
+    first, third, many = asyncio.run(load())
+    assert (first, third, many) == (NODES["user-0"], NODES["user-2"], [NODES["user-1"]])
+    assert db.queries == [["user-0", "user-2", "user-1"]]
+
+
+def test_results_are_memoized_per_loader():
+    db = NodesDatabase(NODES)
+
+    async def load():
+        loader = NodeLoader(db, "User")
+        first = await loader.load("user-0")
+        again = await asyncio.gather(loader.load("user-0"), loader.load("user-0"))
+        other_request = await NodeLoader(db, "User").load("user-0")
+        return first, again, other_request
+
+    first, again, other_request = asyncio.run(load())
+    assert again == [first, first] and other_request == first
+    assert db.queries == [["user-0"], ["user-0"]]
+
+
+def test_missing_node_loads_none():
+    db = NodesDatabase(NODES)
+
+    async def load():
+        loader = NodeLoader(db, "User")
+        return await loader.load_many(["user-0", "missing", "missing"])
+
+    assert asyncio.run(load()) == [NODES["user-0"], None, None]
+    assert db.queries == [["user-0", "missing"]]
@@ -0,0 +1,59 @@
+"""Keyset pages of GET /restaurants and cursors of GET /restaurants/search, with the database faked."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.core.pagination import decode_cursor, encode_cursor
+from src.restaurants.services import list_restaurants, search_restaurants
+
+
+class PageDatabase:
+    """Answers every query with the given rows and records the queries and their parameters."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def read(self, query, parameters=None, **kwargs):
+        self.queries.append((query, parameters))
+        return self.rows[:parameters["limit"]]
+
+
+def restaurant(number):
+    return {"res": {"id": f"restaurant-{number}"}, "created_at": "2026-01-01T00:00:00", "id": f"restaurant-{number}"}
+
+
+def test_first_page_seeks_the_created_at_index():
+    db = PageDatabase([restaurant(number) for number in range(3)])
+    items, cursor = asyncio.run(list_restaurants(db, {"cuisine": "thai", "name": None}, ["id"], limit=2))
+
+    query, parameters = db.queries[0]
+    assert "WHERE res.created_at IS NOT NULL AND res.cuisine = $cuisine" in query
+    assert parameters == {"limit": 3, "cuisine": "thai"}
+    assert items == [{"id": "restaurant-0"}, {"id": "restaurant-1"}]
+    assert decode_cursor(cursor, 2) == ["2026-01-01T00:00:00", "restaurant-1"]
+
+
+def test_next_page_seeks_from_the_cursor_and_breaks_ties_by_id():
+    db = PageDatabase([restaurant(number) for number in range(2)])
+    _, cursor = asyncio.run(list_restaurants(db, {}, ["id"], limit=1))
+    _, next_cursor = asyncio.run(list_restaurants(db, {}, ["id"], limit=2, cursor=cursor))
+
+    query, parameters = db.queries[1]
+    match, tie_break, order, _ = query.split("\n")
+    assert match == "MATCH (res:Restaurant) WHERE res.created_at >= $after_created_at"
+    assert tie_break == "WITH res WHERE res.created_at > $after_created_at OR res.id > $after_id"
+    assert order == "WITH res ORDER BY res.created_at, res.id LIMIT $limit"
+    assert parameters["after_id"] == "restaurant-0"
+    assert next_cursor is None
+
+
+@pytest.mark.parametrize("offset", [True, False, -1, "20", 2.5, None])
+def test_search_rejects_cursors_that_are_not_an_offset(offset):
+    db = PageDatabase([])
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(search_restaurants(db, "pizza", False, 10, encode_cursor([offset])))
+
+    assert err.value.status_code == 400 and err.value.detail.startswith("Invalid cursor")
+    assert db.queries == []
@@ -0,0 +1,69 @@
+"""PATCH routes must send one query text whatever the payload, with the values as parameters only."""
+import asyncio
+import random
+import string
+from typing import Any, Dict, List, Optional
+
+from src.restaurants.routes import update_restaurant
+from src.restaurants.schemas import RestaurantUpdate
+from src.users.routes import update_profile
+from src.users.schemas import UserUpdate
+
+
+class RecordingDatabase:
+    """Records every query it is given and returns the node the query would have updated."""
+
+    def __init__(self, alias: str, node: Dict[str, Any]):
+        self.alias = alias
+        self.node = node
+        self.queries: List[str] = []
+        self.values: List[Any] = []
+
+    async def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, name: str = "unnamed", **kwargs):
+        self.queries.append(query)
+        props = parameters["props"]
+        self.values += [value for key, value in parameters.items() if key != "props"] + list(props.values())
+        return [{self.alias: {**self.node, **props}, "previous_cuisine": self.node.get("cuisine")}]
+
+
+"""Quotes, braces and Cypher keywords that would break or change an interpolated query."""
+NASTY = ['"', "'", "\\", "`", "}", "{", "$", "//", " DETACH DELETE res ", " RETURN 1 ", "\n", "é", "漢"]
+
+
+def random_text(rng: random.Random) -> str:
+    length = rng.randint(8, 30)
+    parts = [rng.choice(NASTY) if rng.random() < 0.3 else rng.choice(string.ascii_letters) for _ in range(length)]
+    return "".join(parts) + str(rng.getrandbits(64))
+
+
+def random_fields(rng: random.Random, fields) -> Dict[str, Any]:
+    return {field: random_text(rng) for field in fields if rng.random() < 0.5}
+
+
+def test_update_restaurant_query_text_does_not_depend_on_values():
+    rng = random.Random(13)
+    db = RecordingDatabase("res", {"id": "restaurant-1", "name": "Restaurant"})
+    for _ in range(200):
+        payload = random_fields(rng, [field for field in RestaurantUpdate.__fields__ if field != "geo"])
+        if rng.random() < 0.5:
+            payload["geo"] = {"latitude": rng.uniform(-90, 90), "longitude": rng.uniform(-180, 180)}
+        asyncio.run(update_restaurant("restaurant-1", RestaurantUpdate(**payload), db=db))
+
+    assert len(set(db.queries)) == 1
+    query = db.queries[0]
+    for value in db.values:
+        assert str(value) not in query
+
+
+def test_update_profile_query_text_does_not_depend_on_values():
+    rng = random.Random(13)
+    user = {"id": "user-1", "email": "user@example.com", "is_active": True, "joined": "2021-11-01T00:00:00"}
+    db = RecordingDatabase("user", user)
+    for _ in range(200):
+        payload = random_fields(rng, UserUpdate.__fields__)
+        asyncio.run(update_profile("user-1", UserUpdate(**payload), db=db))
+
+    assert len(set(db.queries)) == 1
+    query = db.queries[0]
+    for value in db.values:
+        assert str(value) not in query
@@ -0,0 +1,28 @@
+"""Similarity refresh, computed in the worker process from the LIKES edges a fake database streams."""
+import asyncio
+
+import pytest
+
+from src.restaurants.recommendations import SimilarityIndex
+
+
+LIKES_BY_USER = {
+    "user-0": ["restaurant-0", "restaurant-1"],
+    "user-1": ["restaurant-0", "restaurant-1", "restaurant-2"],
+    "user-2": ["restaurant-2", "restaurant-3"],
+}
+
+
+class LikesDatabase:
+    async def stream(self, query, parameters=None, **kwargs):
+        for user_id, liked in LIKES_BY_USER.items():
+            yield {"user_id": user_id, "liked": liked}
+
+
+def test_refresh_computes_neighbours_out_of_process():
+    index = SimilarityIndex(top_k=2)
+    asyncio.run(index.refresh(LikesDatabase()))
+
+    assert index.neighbours == SimilarityIndex.compute(LIKES_BY_USER.values(), top_k=2)
+    assert index.neighbours["restaurant-0"][0] == ("restaurant-1", pytest.approx(1.0))
+    assert index.recommend(["restaurant-0"], limit=1) == [("restaurant-1", pytest.approx(1.0))]
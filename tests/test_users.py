@@ -0,0 +1,62 @@
+"""POST /users/change-password against the stored password hash, with the database faked."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from src.auth.services import create_access_token, decode_access_token, pwd_context, token_cache, user_cache
+from src.users.routes import change_password
+from src.users.schemas import UserChangePassword, UserInDB
+
+
+class PasswordDatabase:
+    """Stores one user's password hash, and whether the caches held the user when it was changed."""
+
+    def __init__(self, hashed_password):
+        self.hashed_password = hashed_password
+        self.cached_during_write = None
+
+    async def run(self, query, parameters=None, name="unnamed", **kwargs):
+        if name == "users.password_hash":
+            return [{"hashed_password": self.hashed_password}]
+        self.cached_during_write = (user_cache.get(parameters["user_id"]), len(token_cache))
+        self.hashed_password = parameters["new_password_hash"]
+        return [{"user": {}}]
+
+
+@pytest.fixture
+def cached_user():
+    """The user as get_current_user cached it, while the password was still "old"."""
+    user = UserInDB(
+        id="user-0", email="user@example.com", is_active=True, joined=datetime.utcnow(),
+        hashed_password=pwd_context.hash("old"),
+    )
+    token = create_access_token({"sub": user.id})
+    decode_access_token(token)
+    user_cache.set(user.id, user)
+    yield user, HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    user_cache.clear()
+    token_cache.clear()
+
+
+def test_old_password_is_checked_against_the_stored_hash(cached_user):
+    user, token = cached_user
+    db = PasswordDatabase(pwd_context.hash("changed elsewhere"))
+    change = UserChangePassword(old_password="old", new_password="new")
+
+    with pytest.raises(HTTPException) as err:
+        asyncio.run(change_password(change, current_user=user, token=token, db=db))
+    assert err.value.status_code == 400
+    assert user_cache.get(user.id) is user
+
+
+def test_caches_are_evicted_before_the_write(cached_user):
+    user, token = cached_user
+    db = PasswordDatabase(user.hashed_password)
+    change = UserChangePassword(old_password="old", new_password="new")
+    asyncio.run(change_password(change, current_user=user, token=token, db=db))
+
+    assert db.cached_during_write == (None, 0)
+    assert pwd_context.verify("new", db.hashed_password)